@@ -0,0 +1,129 @@
+"""
+Бенчмарк выборок истории товара на синтетической таблице.
+
+Во временной таблице с копией структуры product_history генерируется
+история через generate_series (по умолчанию 5 млн строк), после чего
+запросы последних записей и периода [from, to) замеряются без индекса
+и с индексом (product_id, created_at DESC).
+
+Нужна база PostgreSQL из DATABASE_URL с уже созданной схемой приложения.
+Запуск из корня репозитория:
+    python benchmarks/bench_history_queries.py [--rows 5000000] [--products 50000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+load_dotenv()
+
+QUERIES = {
+    "last 100": """
+        SELECT * FROM bench_history
+        WHERE product_id = :product_id
+        ORDER BY created_at DESC
+        LIMIT 100
+    """,
+    "range 1 day": """
+        SELECT * FROM bench_history
+        WHERE product_id = :product_id
+          AND created_at >= :date_from
+          AND created_at < :date_to
+        ORDER BY created_at DESC
+        LIMIT 1000
+    """,
+}
+
+
+async def measure(conn, query: str, params: list[dict]) -> float:
+    """Среднее время запроса в миллисекундах."""
+    started = time.perf_counter()
+    for item in params:
+        await conn.execute(text(query), item)
+    return (time.perf_counter() - started) / len(params) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    async with engine.connect() as conn:
+        await conn.execute(
+            text(
+                "CREATE TEMP TABLE bench_history "
+                "(LIKE product_history INCLUDING DEFAULTS)"
+            )
+        )
+        # Строки товара идут с шагом 5 минут от текущего времени назад
+        started = time.perf_counter()
+        await conn.execute(
+            text(
+                """
+                INSERT INTO bench_history (
+                    id, product_id, sell_price, standart_price,
+                    total_quantity, rating, created_at
+                )
+                SELECT
+                    n,
+                    n % :products + 1,
+                    random() * 1000,
+                    random() * 1500,
+                    (random() * 500)::int,
+                    random() * 5,
+                    now() - (n / :products) * INTERVAL '5 minutes'
+                FROM generate_series(1, :rows) AS n
+                """
+            ),
+            {"rows": args.rows, "products": args.products},
+        )
+        await conn.execute(text("ANALYZE bench_history"))
+        print(
+            f"Сгенерировано {args.rows} строк для {args.products} товаров "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+        date_to = (await conn.execute(text("SELECT now()::timestamp"))).scalar()
+        params = [
+            {
+                "product_id": random.randint(1, args.products),
+                "date_from": date_to - timedelta(days=1),
+                "date_to": date_to,
+            }
+            for _ in range(args.number)
+        ]
+
+        results = {}
+        for name, query in QUERIES.items():
+            results[name] = [await measure(conn, query, params)]
+
+        started = time.perf_counter()
+        await conn.execute(
+            text("CREATE INDEX ON bench_history (product_id, created_at DESC)")
+        )
+        await conn.execute(text("ANALYZE bench_history"))
+        print(f"Индекс построен за {time.perf_counter() - started:.1f} с")
+
+        for name, query in QUERIES.items():
+            results[name].append(await measure(conn, query, params))
+
+        for name, (baseline, indexed) in results.items():
+            print(
+                f"{name:<12} без индекса: {baseline:9.2f} ms  "
+                f"с индексом: {indexed:7.2f} ms  x{baseline / indexed:.0f}"
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
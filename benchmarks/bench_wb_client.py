@@ -0,0 +1,138 @@
+"""
+Сквозной замер клиента Wildberries на локальной заглушке API.
+
+По умолчанию заглушка (tests/wb_stub.py) запускается в том же процессе,
+для точных замеров ее лучше запустить отдельно и передать --url.
+С флагом --scheduler вместо пакетного запроса клиента выполняется
+полный цикл планировщика add_product_in_db: товары с синтетическими
+артикулами добавляются в базу DATABASE_URL, история пишется в нее же.
+
+Примеры:
+    python benchmarks/bench_wb_client.py --products 10000 --latency 0.05
+    python benchmarks/bench_wb_client.py --burst-every 50 --burst-length 5
+    python tests/wb_stub.py --port 8081 &
+    python benchmarks/bench_wb_client.py --url http://127.0.0.1:8081/cards/v1/detail
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+from tests.wb_stub import StubConfig, start_stub  # noqa: E402
+
+FIRST_ARTIKUL = 100_000_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="URL уже запущенной заглушки")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--scheduler", action="store_true")
+    parser.add_argument(
+        "--metrics", action="store_true", help="вывести метрики клиента"
+    )
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--size-factor", type=int, default=1)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    return parser.parse_args()
+
+
+async def seed_products(artikuls: list[str]):
+    from sqlalchemy.dialects.postgresql import insert
+
+    from database.main import async_session, init_models
+    from models import ProductModel
+
+    await init_models()
+    async with async_session() as session:
+        for i in range(0, len(artikuls), 1000):
+            await session.execute(
+                insert(ProductModel)
+                .values(
+                    [
+                        {
+                            "marketplace": "wildberries",
+                            "artikul": artikul,
+                            "name": f"Bench product {artikul}",
+                        }
+                        for artikul in artikuls[i : i + 1000]
+                    ]
+                )
+                .on_conflict_do_nothing(constraint="uq_marketplace_artikul")
+            )
+        await session.commit()
+
+
+async def run(args):
+    runner = stub = None
+    url = args.url
+    if not url:
+        stub, runner, url = await start_stub(
+            StubConfig(
+                latency=args.latency,
+                latency_jitter=args.latency_jitter,
+                error_rate=args.error_rate,
+                burst_every=args.burst_every,
+                burst_length=args.burst_length,
+                retry_after=args.retry_after,
+                size_factor=args.size_factor,
+                missing_rate=args.missing_rate,
+            )
+        )
+    # Клиент читает адрес API при импорте модуля
+    os.environ["WB_BASE_URL"] = url
+    os.environ.setdefault("WB_CACHE_ENABLED", "0")
+    from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
+        wb_client,
+    )
+
+    artikuls = [str(FIRST_ARTIKUL + i) for i in range(args.products)]
+    try:
+        if args.scheduler:
+            from scheduler.tasks import add_product_in_db
+
+            await seed_products(artikuls)
+            started = time.perf_counter()
+            await add_product_in_db()
+            elapsed = time.perf_counter() - started
+            received = None
+        else:
+            started = time.perf_counter()
+            result = await wb_client.fetch_products_details(artikuls)
+            elapsed = time.perf_counter() - started
+            received = sum(1 for product in result.values() if product)
+    finally:
+        await wb_client.close()
+        if runner:
+            await runner.cleanup()
+
+    print(f"products:        {args.products}")
+    if received is not None:
+        print(f"received:        {received}")
+    print(f"elapsed:         {elapsed:.2f} s")
+    print(f"throughput:      {args.products / elapsed:.0f} products/s")
+    print(f"final rate:      {wb_client.rate_limiter.rate:.2f} req/s")
+    print(f"circuit breaker: {wb_client.circuit_breaker.state}")
+    if stub:
+        print(
+            f"stub requests:   {stub.stats.requests} "
+            f"(429: {stub.stats.throttled}, 500: {stub.stats.errors})"
+        )
+    if args.metrics:
+        print(wb_client.metrics.render_prometheus())
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
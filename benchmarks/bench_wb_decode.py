@@ -0,0 +1,74 @@
+"""
+Микробенчмарк разбора ответа card.wb.ru.
+
+Сравнивает прежний путь (json.loads полного документа и обход словарей)
+с декодированием msgspec в компактные записи на записанных ответах API.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_wb_decode.py [--number 200]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from routers.third_party_integrations.service.wb.service.wb_payload import (  # noqa: E402
+    decode_products,
+)
+
+PAYLOADS_DIR = ROOT / "tests" / "payloads"
+
+
+def decode_products_json(raw: bytes) -> list[dict]:
+    """Прежний разбор: полный документ через json.loads."""
+    data = json.loads(raw)
+    result = []
+    for product in data.get("data", {}).get("products", []):
+        price_u = product.get("priceU")
+        sale_price_u = product.get("salePriceU")
+        total_quantity = 0
+        for size in product.get("sizes", []):
+            total_quantity += sum(item.get("qty", 0) for item in size.get("stocks", []))
+        result.append(
+            {
+                "artikul": str(product.get("id")),
+                "name": str(product.get("name")),
+                "standart_price": float(price_u / 100 if price_u is not None else 0.0),
+                "sell_price": float(
+                    sale_price_u / 100 if sale_price_u is not None else 0.0
+                ),
+                "total_quantity": int(total_quantity),
+                "rating": float(product.get("reviewRating", 0.0)),
+            }
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    for path in sorted(PAYLOADS_DIR.glob("wb_detail_*.json")):
+        raw = path.read_bytes()
+        assert decode_products(raw) == decode_products_json(raw), path.name
+
+        baseline = min(
+            timeit.repeat(lambda: decode_products_json(raw), number=args.number, repeat=5)
+        )
+        fast = min(timeit.repeat(lambda: decode_products(raw), number=args.number, repeat=5))
+        print(
+            f"{path.name:<28} {len(raw) / 1024:8.1f} KiB  "
+            f"json: {baseline / args.number * 1e6:9.1f} us  "
+            f"msgspec: {fast / args.number * 1e6:9.1f} us  "
+            f"x{baseline / fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
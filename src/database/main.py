@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import text
 from dotenv import load_dotenv
 import os
 from models import ProductModel, UserModel, UserSubsToProductModel
@@ -14,10 +15,43 @@ engine = create_async_engine(DATABASE_URL, echo=ECHO_DB)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
+# create_all не изменяет существующие таблицы, поэтому колонки,
+# добавленные после их создания, досоздаются отдельно
+SCHEMA_UPGRADES = [
+    "ALTER TABLE product_history ADD COLUMN IF NOT EXISTS region_quantities JSON",
+    "ALTER TABLE product_history ADD COLUMN IF NOT EXISTS valid_to TIMESTAMP",
+    """
+    ALTER TABLE product_poll_schedule
+    ADD COLUMN IF NOT EXISTS failure_streak INTEGER NOT NULL DEFAULT 0
+    """,
+    # Для существующих таблиц create_all индексы не создает
+    """
+    CREATE INDEX IF NOT EXISTS ix_product_history_product_id_created_at
+    ON product_history (product_id, created_at DESC)
+    """,
+    # Заполнение product_latest по истории, пока таблица пуста
+    """
+    INSERT INTO product_latest (
+        product_id, sell_price, standart_price, total_quantity, rating,
+        region_quantities, created_at
+    )
+    SELECT DISTINCT ON (product_id)
+        product_id, sell_price, standart_price, total_quantity, rating,
+        region_quantities, COALESCE(valid_to, created_at)
+    FROM product_history
+    WHERE NOT EXISTS (SELECT 1 FROM product_latest)
+    ORDER BY product_id, created_at DESC
+    ON CONFLICT (product_id) DO NOTHING
+    """,
+]
+
+
 async def init_models():
     logger.info("START TABLE CREATE")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
     logger.info("Database tables created")
 
 
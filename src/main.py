@@ -10,12 +10,21 @@ from middleware.auth_middleware import auth_middleware
 from routers.auth.router import router as auth_router
 
 from routers.third_party_integrations.router import third_party_router
+from routers.scheduler.router import router as scheduler_router
 from database.main import init_models
+from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
+    wb_client,
+)
+from routers.third_party_integrations.service.wb.wb_router import warm_product_index
 
 from scheduler.main import main_scheduler
 from dotenv import load_dotenv
 
 load_dotenv()
+
+# 0 - обновление товаров выполняет отдельный сервис scheduler.ingest
+SCHEDULER_IN_API = os.getenv("SCHEDULER_IN_API", "1") == "1"
+scheduler_task = None
 # Настройка базового логгера
 logger.add(
     "logs/app.log",
@@ -37,10 +46,17 @@ async def lifespan(app: FastAPI):
         await init_models()
         logger.info("Database connection established")
 
+        # Открываем общую HTTP-сессию для запросов к Wildberries
+        await wb_client.start()
+
+        # Индекс артикул -> id товара для запросов по артикулу
+        await warm_product_index()
+
         # Запускаем планировщик в отдельной задаче
 
         global scheduler_task
-        scheduler_task = asyncio.create_task(main_scheduler())
+        if SCHEDULER_IN_API:
+            scheduler_task = asyncio.create_task(main_scheduler())
 
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
@@ -58,6 +74,7 @@ async def lifespan(app: FastAPI):
             logger.info("Scheduler task cancelled successfully")
         except Exception as e:
             logger.error(f"Error while cancelling scheduler task: {e}")
+    await wb_client.close()
     print("Shutdown logic here")
 
 
@@ -77,6 +94,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(third_party_router, prefix="/api/v1/third-party")
+app.include_router(scheduler_router, prefix="/api/v1/scheduler", tags=["scheduler"])
 
 
 if __name__ == "__main__":
@@ -1,3 +1,9 @@
-from models.product import ProductModel, ProductHistoryModel
+from models.product import (
+    ProductModel,
+    ProductHistoryModel,
+    ProductLatestModel,
+    ProductPollScheduleModel,
+)
 from models.user import UserModel
 from models.user_subs import UserSubsToProductModel
+from models.refresh_run import RefreshRunModel
@@ -5,6 +5,8 @@ from sqlalchemy import (
     Float,
     DateTime,
     ForeignKey,
+    Index,
+    JSON,
     UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
@@ -33,6 +35,14 @@ class ProductModel(Base):
     # Связь с таблицей подписок
     subscriptions = relationship("UserSubsToProductModel", back_populates="product")
 
+    # Последние данные о товаре
+    latest = relationship("ProductLatestModel", back_populates="product", uselist=False)
+
+    # Расписание опроса товара
+    poll_schedule = relationship(
+        "ProductPollScheduleModel", back_populates="product", uselist=False
+    )
+
 
 class ProductHistoryModel(Base):
     __tablename__ = "product_history"
@@ -46,7 +56,65 @@ class ProductHistoryModel(Base):
     total_quantity = Column(Integer, nullable=False)
     rating = Column(Float, nullable=False, default=0.0)
 
+    # Остатки по регионам доставки: {dest: количество}
+    region_quantities = Column(JSON, nullable=True)
+
     created_at = Column(DateTime, server_default=func.now())
+    # Время последнего опроса с теми же данными (режим HISTORY_STORAGE_MODE=interval)
+    valid_to = Column(DateTime, nullable=True)
+
+    # Индекс для выборки истории товара от новых записей к старым
+    __table_args__ = (
+        Index(
+            "ix_product_history_product_id_created_at",
+            product_id,
+            created_at.desc(),
+        ),
+    )
 
     # Обратная ссылка на продукт
     product = relationship("ProductModel", back_populates="history")
+
+
+class ProductPollScheduleModel(Base):
+    __tablename__ = "product_poll_schedule"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+
+    # Время следующего опроса и текущий интервал в секундах
+    next_poll_at = Column(DateTime, nullable=False, index=True)
+    interval_seconds = Column(Integer, nullable=False)
+
+    # Число опросов подряд без изменения данных
+    unchanged_streak = Column(Integer, nullable=False, default=0)
+    # Число неудачных опросов подряд: данные не получены или не записаны
+    failure_streak = Column(Integer, nullable=False, default=0)
+    last_polled_at = Column(DateTime, nullable=True)
+    last_changed_at = Column(DateTime, nullable=True)
+
+    product = relationship("ProductModel", back_populates="poll_schedule")
+
+
+class ProductLatestModel(Base):
+    """
+    Последние данные о товаре. Обновляется в той же транзакции,
+    что и запись истории, и позволяет получать текущее состояние
+    товара по первичному ключу без сортировки истории.
+    """
+
+    __tablename__ = "product_latest"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+
+    sell_price = Column(Float, nullable=False)
+    standart_price = Column(Float, nullable=False)
+
+    total_quantity = Column(Integer, nullable=False)
+    rating = Column(Float, nullable=False, default=0.0)
+
+    region_quantities = Column(JSON, nullable=True)
+
+    # Время последнего опроса товара
+    created_at = Column(DateTime, server_default=func.now())
+
+    product = relationship("ProductModel", back_populates="latest")
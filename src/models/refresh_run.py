@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy.sql import func
+from database.base import Base
+
+
+class RefreshRunModel(Base):
+    __tablename__ = "refresh_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # running - выполняется или прерван, completed, failed,
+    # abandoned - прерван и не продолжен
+    status = Column(String, nullable=False, default="running", index=True)
+    # Маркетплейс и шарды, которые обновляет запуск
+    scope = Column(JSON, nullable=False)
+
+    # Наибольший id товара, до которого включительно обработаны все товары
+    cursor = Column(Integer, nullable=False, default=0)
+
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    # Причины ошибок по артикулу
+    failures = Column(JSON, nullable=True)
+
+    duration_seconds = Column(Float, nullable=True)
+    started_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -8,6 +8,20 @@ load_dotenv()
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 
+# Продление и освобождение аренды только ее владельцем
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisClient:
     def __init__(self, url=f"redis://{REDIS_HOST}:{REDIS_PORT}", decode_responses=True):
@@ -40,6 +54,74 @@ class RedisClient:
     async def check_blacklist(self, user_id):
         return await self.redis.exists(f"blacklist-{user_id}")
 
+    async def save_product_details(self, artikul, payload: str, ttl: int):
+        await self.redis.set(f"wb-product-{artikul}", payload, ex=ttl)
+
+    async def save_products_details(self, payloads: dict, ttl: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for artikul, payload in payloads.items():
+                pipe.set(f"wb-product-{artikul}", payload, ex=ttl)
+            await pipe.execute()
+
+    async def get_product_details(self, artikul):
+        return await self.redis.get(f"wb-product-{artikul}")
+
+    async def acquire_lease(self, name, owner, ttl_ms: int) -> bool:
+        return bool(
+            await self.redis.set(f"lease-{name}", owner, nx=True, px=ttl_ms)
+        )
+
+    async def renew_lease(self, name, owner, ttl_ms: int) -> bool:
+        return bool(
+            await self.redis.eval(RENEW_LEASE_SCRIPT, 1, f"lease-{name}", owner, ttl_ms)
+        )
+
+    async def release_lease(self, name, owner) -> bool:
+        return bool(
+            await self.redis.eval(RELEASE_LEASE_SCRIPT, 1, f"lease-{name}", owner)
+        )
+
+    async def register_worker(self, group, worker_id, expires_at_ms: int):
+        await self.redis.zadd(f"workers-{group}", {worker_id: expires_at_ms})
+
+    async def unregister_worker(self, group, worker_id):
+        await self.redis.zrem(f"workers-{group}", worker_id)
+
+    async def count_workers(self, group, now_ms: int) -> int:
+        await self.redis.zremrangebyscore(f"workers-{group}", "-inf", now_ms)
+        return await self.redis.zcard(f"workers-{group}")
+
+    async def set_scheduler_paused(self, paused: bool):
+        if paused:
+            await self.redis.set("scheduler-paused", "1")
+        else:
+            await self.redis.delete("scheduler-paused")
+
+    async def is_scheduler_paused(self) -> bool:
+        return bool(await self.redis.exists("scheduler-paused"))
+
+    async def push_urgent_artikuls(self, artikuls) -> int:
+        return await self.redis.rpush("scheduler-urgent", *artikuls)
+
+    async def pop_urgent_artikuls(self, count: int) -> list:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange("scheduler-urgent", 0, count - 1)
+            pipe.ltrim("scheduler-urgent", count, -1)
+            artikuls, _ = await pipe.execute()
+        return artikuls
+
+    async def count_urgent_artikuls(self) -> int:
+        return await self.redis.llen("scheduler-urgent")
+
+    async def save_scheduler_status(self, worker_id, status: str, ttl: int):
+        await self.redis.set(f"scheduler-status-{worker_id}", status, ex=ttl)
+
+    async def get_scheduler_statuses(self) -> list:
+        keys = [key async for key in self.redis.scan_iter("scheduler-status-*")]
+        if not keys:
+            return []
+        return [status for status in await self.redis.mget(keys) if status]
+
     async def close_connection(self):
         await self.redis.close()
         await self.redis.wait_closed()
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from dotenv import load_dotenv
+import os
+
+from database import get_session
+from schemas.scheduler import UrgentRefreshRequest
+from scheduler.control import scheduler_control
+from routers.auth.service.security import decode_token_to_user_id
+from routers.third_party_integrations.service.wb.service.product_repo import (
+    ProductRepository,
+)
+
+load_dotenv()
+
+# id пользователей через запятую, которым доступно управление планировщиком
+SCHEDULER_ADMIN_IDS = {
+    int(user_id)
+    for user_id in os.getenv("SCHEDULER_ADMIN_IDS", "").split(",")
+    if user_id.strip()
+}
+
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="/api/v1/auth/auth-by-username",
+    scopes={
+        "logout": "Log out of the application",
+    },
+)
+
+product_repository = ProductRepository()
+
+
+async def get_scheduler_admin(token: str = Depends(oauth2_scheme)) -> int:
+    user_id = await decode_token_to_user_id(
+        token, HTTPException(status_code=401, detail="Invalid token")
+    )
+    if user_id not in SCHEDULER_ADMIN_IDS:
+        logger.error(f"User {user_id} is not allowed to control the scheduler")
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return user_id
+
+
+@router.post("/refresh")
+async def refresh_products(
+    request: UrgentRefreshRequest,
+    user_id: int = Depends(get_scheduler_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    срочно обновить данные о товарах вне цикла планировщика
+    """
+    artikuls = list(dict.fromkeys(request.artikuls))
+    products = await product_repository.get_products_by_artikuls(
+        "wildberries", artikuls, session
+    )
+    known = {product.artikul for product in products}
+    queued = [artikul for artikul in artikuls if artikul in known]
+    not_found = [artikul for artikul in artikuls if artikul not in known]
+    if not queued:
+        raise HTTPException(status_code=404, detail="Products not found")
+
+    queue_depth = await scheduler_control.enqueue(queued)
+    logger.info(f"Queued urgent refresh of {len(queued)} products")
+    return {"queued": queued, "not_found": not_found, "queue_depth": queue_depth}
+
+
+@router.post("/pause")
+async def pause_scheduler(user_id: int = Depends(get_scheduler_admin)):
+    """
+    приостановить циклы планировщика (срочная очередь продолжает работать)
+    """
+    await scheduler_control.pause()
+    logger.info("Scheduler paused")
+    return {"paused": True}
+
+
+@router.post("/resume")
+async def resume_scheduler(user_id: int = Depends(get_scheduler_admin)):
+    """
+    возобновить циклы планировщика
+    """
+    await scheduler_control.resume()
+    logger.info("Scheduler resumed")
+    return {"paused": False}
+
+
+@router.get("/status")
+async def get_scheduler_status(user_id: int = Depends(get_scheduler_admin)):
+    """
+    пауза, глубина срочной очереди и текущая работа процессов планировщика
+    """
+    return await scheduler_control.get_state()
@@ -0,0 +1,91 @@
+import time
+
+from loguru import logger
+
+
+class CircuitBreakerOpenError(Exception):
+    """
+    Запрос отклонен без обращения к API, так как цепь разомкнута.
+    """
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для запросов к внешнему API.
+
+    После failure_threshold ошибок подряд цепь размыкается и запросы
+    отклоняются сразу. Через recovery_timeout секунд цепь переходит
+    в полуоткрытое состояние и пропускает до half_open_max_calls пробных
+    запросов: успешный пробный запрос замыкает цепь, ошибка снова ее размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info("Circuit breaker is half-open, probing upstream")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Проверяет, можно ли выполнить запрос.
+
+        Returns:
+            bool: True если запрос разрешен
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        return False
+
+    def release_probe(self):
+        """
+        Возвращает слот пробного запроса, который был прерван
+        (например, отменой задачи) и не завершился ни успехом, ни ошибкой.
+        """
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info("Circuit breaker closed, upstream recovered")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(
+                    f"Circuit breaker opened after {self._failures} failures "
+                    f"for {self.recovery_timeout} s"
+                )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
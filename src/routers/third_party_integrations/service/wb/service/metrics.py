@@ -0,0 +1,139 @@
+import bisect
+from typing import Dict, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values: Dict[str, int] = {}
+
+    def inc(self, label_value: str, amount: int = 1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Оценка квантиля по верхним границам корзин.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class WildberriesClientMetrics:
+    """
+    Метрики запросов WildberriesAPIClient: счетчики попыток и итогов
+    вызовов, гистограммы времени до первого байта, размера ответа,
+    времени разбора и числа попыток на вызов.
+    """
+
+    def __init__(self):
+        self.attempts = Counter(
+            "wb_client_attempts_total", "Upstream attempts by status", "status"
+        )
+        self.calls = Counter(
+            "wb_client_calls_total", "Upstream calls by final outcome", "outcome"
+        )
+        self.attempts_per_call = Histogram(
+            "wb_client_attempts_per_call", "Attempts made per call", ATTEMPT_BUCKETS
+        )
+        self.ttfb = Histogram(
+            "wb_client_ttfb_seconds", "Time to response headers", LATENCY_BUCKETS
+        )
+        self.body_size = Histogram(
+            "wb_client_body_bytes", "Response body size", SIZE_BUCKETS
+        )
+        self.decode_time = Histogram(
+            "wb_client_decode_seconds", "Response decode time", LATENCY_BUCKETS
+        )
+
+    def _metrics(self) -> list:
+        return [
+            self.attempts,
+            self.calls,
+            self.attempts_per_call,
+            self.ttfb,
+            self.body_size,
+            self.decode_time,
+        ]
+
+    def record_attempt(self, status: str, ttfb: float | None = None):
+        self.attempts.inc(status)
+        if ttfb is not None:
+            self.ttfb.observe(ttfb)
+
+    def record_body(self, size: int, decode_time: float):
+        self.body_size.observe(size)
+        self.decode_time.observe(decode_time)
+
+    def record_call(self, outcome: str, attempts: int):
+        self.calls.inc(outcome)
+        self.attempts_per_call.observe(attempts)
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self._metrics()}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,82 @@
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from redis_client import RedisClient
+
+
+class ProductCache:
+    """
+    Кэш данных о товарах Wildberries в Redis.
+
+    Запись считается свежей ttl секунд после получения, затем еще
+    stale_ttl секунд ее можно отдавать устаревшей, обновляя в фоне.
+    Ошибки Redis не прерывают запрос: кэш просто считается пустым.
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        ttl: int = 300,
+        stale_ttl: int = 3600,
+        enabled: bool = True,
+    ):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.enabled = enabled
+
+    def _dump(self, payload: Dict[str, Any]) -> str:
+        return json.dumps({"fetched_at": time.time(), "payload": payload})
+
+    async def get(self, artikul: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Возвращает данные о товаре из кэша.
+
+        Returns:
+            Optional[Tuple[Dict[str, Any], bool]]: Данные о товаре и признак
+            свежести записи или None, если записи нет
+        """
+        if not self.enabled:
+            return None
+        try:
+            raw = await self.redis_client.get_product_details(artikul)
+            if not raw:
+                return None
+            entry = json.loads(raw)
+            is_fresh = time.time() - entry["fetched_at"] < self.ttl
+            return entry["payload"], is_fresh
+        except Exception as e:
+            # Поврежденная запись считается промахом кэша
+            logger.warning(f"Product cache read failed for {artikul}: {e}")
+            return None
+
+    async def set(self, artikul: str, payload: Dict[str, Any]):
+        if not self.enabled:
+            return
+        try:
+            await self.redis_client.save_product_details(
+                artikul, self._dump(payload), self.ttl + self.stale_ttl
+            )
+        except Exception as e:
+            logger.warning(f"Product cache write failed for {artikul}: {e}")
+
+    async def set_many(self, products: Dict[str, Optional[Dict[str, Any]]]):
+        """
+        Сохраняет в кэш результаты пакетного запроса одним pipeline.
+        """
+        payloads = {
+            artikul: self._dump(payload)
+            for artikul, payload in products.items()
+            if payload
+        }
+        if not self.enabled or not payloads:
+            return
+        try:
+            await self.redis_client.save_products_details(
+                payloads, self.ttl + self.stale_ttl
+            )
+        except Exception as e:
+            logger.warning(f"Product cache write failed for {len(payloads)} items: {e}")
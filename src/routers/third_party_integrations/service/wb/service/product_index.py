@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+PRODUCT_INDEX_MAX_SIZE = int(os.getenv("PRODUCT_INDEX_MAX_SIZE", 100000))
+
+
+class ProductIdIndex:
+    """
+    Ограниченный LRU-кэш соответствия (marketplace, artikul) -> id товара.
+    marketplace None - поиск товара по артикулу на любом маркетплейсе.
+
+    id товара не меняется, поэтому запись устаревает только при удалении
+    товара, которое должно вызывать invalidate.
+
+    Args:
+        max_size: Максимальное число записей
+    """
+
+    def __init__(self, max_size: int = PRODUCT_INDEX_MAX_SIZE):
+        self.max_size = max_size
+        self._ids: "OrderedDict[Tuple[Optional[str], str], int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, marketplace: Optional[str], artikul: str) -> Optional[int]:
+        key = (marketplace, artikul)
+        product_id = self._ids.get(key)
+        if product_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._ids.move_to_end(key)
+        return product_id
+
+    def set(self, marketplace: Optional[str], artikul: str, product_id: int):
+        if self.max_size <= 0:
+            return
+        key = (marketplace, artikul)
+        self._ids[key] = product_id
+        self._ids.move_to_end(key)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def set_many(self, marketplace: str, product_ids: Dict[str, int]):
+        for artikul, product_id in product_ids.items():
+            self.set(marketplace, artikul, product_id)
+
+    def invalidate(self, marketplace: str, artikul: str):
+        self._ids.pop((marketplace, artikul), None)
+        # Поиск по любому маркетплейсу мог вернуть тот же товар
+        self._ids.pop((None, artikul), None)
+
+    def clear(self):
+        self._ids.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._ids),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+product_index = ProductIdIndex()
@@ -1,9 +1,45 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import select, func, text, desc
+from sqlalchemy import select, func, text, desc, update, true
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert
 from schemas import ProductShema, ProductHistoryShema
-from models import ProductModel, ProductHistoryModel
+from models import (
+    ProductModel,
+    ProductHistoryModel,
+    ProductLatestModel,
+    ProductPollScheduleModel,
+    UserSubsToProductModel,
+)
+from scheduler.polling import POLL_DUE_TOLERANCE_SECONDS, compute_next_interval
+from routers.third_party_integrations.service.wb.service.product_index import (
+    ProductIdIndex,
+    product_index,
+)
 from loguru import logger
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+import os
+
+load_dotenv()
+
+# append - каждый опрос добавляет строку истории,
+# interval - неизменившийся опрос только продлевает valid_to текущей строки
+HISTORY_STORAGE_MODE = os.getenv("HISTORY_STORAGE_MODE", "append")
+# Шаг точек временного ряда, восстанавливаемого из интервалов
+HISTORY_POINT_INTERVAL = timedelta(minutes=int(os.getenv("INTERVAL_IN_MINUTES", 5)))
+
+# Число товаров, читаемых из каталога за один запрос
+PRODUCT_STREAM_CHUNK_SIZE = int(os.getenv("PRODUCT_STREAM_CHUNK_SIZE", 1000))
+
+HISTORY_FIELDS = (
+    "sell_price",
+    "standart_price",
+    "total_quantity",
+    "rating",
+    "region_quantities",
+)
 
 
 # class ProductRepository:
@@ -135,6 +171,151 @@ from loguru import logger
 
 
 class ProductRepository:
+    def __init__(
+        self,
+        storage_mode: str = HISTORY_STORAGE_MODE,
+        index: ProductIdIndex = product_index,
+    ):
+        self.storage_mode = storage_mode
+        self.index = index
+
+    @staticmethod
+    def _same_snapshot(
+        history: ProductHistoryModel, snapshot: ProductHistoryShema
+    ) -> bool:
+        return all(
+            getattr(history, field) == getattr(snapshot, field)
+            for field in HISTORY_FIELDS
+        )
+
+    @staticmethod
+    def _expand_intervals(
+        rows: list[ProductHistoryModel],
+        count: int,
+        since: datetime | None = None,
+        before: datetime | None = None,
+    ) -> list[ProductHistoryModel]:
+        """
+        Разворачивает строки истории [created_at, valid_to] в точки с шагом
+        HISTORY_POINT_INTERVAL (от новых к старым), как если бы каждый опрос
+        записывался отдельной строкой. Строки без valid_to дают одну точку.
+
+        Args:
+            since: Нижняя граница точек (включительно)
+            before: Верхняя граница точек (не включительно)
+        """
+        points = []
+        for row in rows:
+            if row.valid_to is None or row.created_at is None:
+                points.append(row)
+            else:
+                moment = row.valid_to
+                if before is not None and moment >= before:
+                    moment -= ((moment - before) // HISTORY_POINT_INTERVAL + 1) * (
+                        HISTORY_POINT_INTERVAL
+                    )
+                lower = row.created_at if since is None else max(row.created_at, since)
+                while moment >= lower and len(points) < count:
+                    points.append(
+                        ProductHistoryModel(
+                            id=row.id,
+                            product_id=row.product_id,
+                            created_at=moment,
+                            valid_to=row.valid_to,
+                            **{field: getattr(row, field) for field in HISTORY_FIELDS},
+                        )
+                    )
+                    moment -= HISTORY_POINT_INTERVAL
+            if len(points) >= count:
+                break
+        return points[:count]
+
+    async def get_unchanged_products(
+        self, snapshots: dict[int, ProductHistoryShema], session: AsyncSession
+    ) -> dict[int, int]:
+        """
+        Находит товары, данные которых совпадают с последней строкой истории.
+
+        Args:
+            snapshots: Новые данные о товарах по id товара
+
+        Returns:
+            dict[int, int]: id последней строки истории по id товара
+        """
+        if not snapshots:
+            return {}
+        try:
+            result = await session.execute(
+                select(ProductHistoryModel)
+                .where(ProductHistoryModel.product_id.in_(list(snapshots)))
+                .distinct(ProductHistoryModel.product_id)
+                .order_by(
+                    ProductHistoryModel.product_id,
+                    ProductHistoryModel.created_at.desc(),
+                )
+            )
+            return {
+                history.product_id: history.id
+                for history in result.scalars().all()
+                if self._same_snapshot(history, snapshots[history.product_id])
+            }
+        except Exception as e:
+            logger.error(f"Error get unchanged products: {e}")
+            raise e
+
+    async def _extend_unchanged_history(
+        self,
+        snapshots: dict[int, ProductHistoryShema],
+        session: AsyncSession,
+        unchanged: dict[int, int] | None = None,
+    ) -> set[int]:
+        """
+        В режиме interval продлевает valid_to текущих строк товаров,
+        данные которых не изменились.
+
+        Returns:
+            set[int]: id товаров, для которых новая строка не нужна
+        """
+        if self.storage_mode != "interval" or not snapshots:
+            return set()
+        if unchanged is None:
+            unchanged = await self.get_unchanged_products(snapshots, session)
+        if unchanged:
+            await session.execute(
+                update(ProductHistoryModel)
+                .where(ProductHistoryModel.id.in_(list(unchanged.values())))
+                .values(valid_to=func.now())
+                .execution_options(synchronize_session=False)
+            )
+        return set(unchanged)
+
+    async def _upsert_latest(
+        self, snapshots: dict[int, ProductHistoryShema], session: AsyncSession
+    ):
+        """
+        Записывает последние данные товаров в product_latest
+        в текущей транзакции записи истории. Запись, начатая раньше уже
+        сохраненной, ее не перезаписывает.
+        """
+        if not snapshots:
+            return
+        stmt = insert(ProductLatestModel).values(
+            [
+                {**snapshot.model_dump(), "product_id": product_id, "created_at": func.now()}
+                for product_id, snapshot in snapshots.items()
+            ]
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ProductLatestModel.product_id],
+                set_={
+                    field: stmt.excluded[field]
+                    for field in (*HISTORY_FIELDS, "created_at")
+                },
+                where=ProductLatestModel.created_at <= stmt.excluded.created_at,
+            )
+        )
+
     async def add_product(
         self, product: ProductShema, session: AsyncSession
     ) -> ProductModel:
@@ -143,11 +324,38 @@ class ProductRepository:
             product = ProductModel(**product_dumb)
             session.add(product)
             await session.commit()
+            self.index.set(product.marketplace, product.artikul, product.id)
             return product
         except IntegrityError as e:
             logger.error(f"Error add product: {e}")
             raise e
 
+    async def add_product_if_not_exists(
+        self, product: ProductShema, session: AsyncSession
+    ) -> int | None:
+        """
+        Добавляет товар одним запросом INSERT ... ON CONFLICT DO NOTHING,
+        поэтому одновременные запросы одного артикула не конфликтуют.
+
+        Returns:
+            int | None: id добавленного товара или None, если он уже был
+        """
+        try:
+            result = await session.execute(
+                insert(ProductModel)
+                .values(**product.model_dump())
+                .on_conflict_do_nothing(constraint="uq_marketplace_artikul")
+                .returning(ProductModel.id)
+            )
+            await session.commit()
+            product_id = result.scalar_one_or_none()
+            if product_id is not None:
+                self.index.set(product.marketplace, product.artikul, product_id)
+            return product_id
+        except Exception as e:
+            logger.error(f"Error add product if not exists: {e}")
+            raise e
+
     async def get_product_by_artikul(
         self, artikul: str, session: AsyncSession
     ) -> ProductModel:
@@ -160,6 +368,63 @@ class ProductRepository:
             logger.error(f"Error get product by artikul: {e}")
             raise e
 
+    async def get_product_id(
+        self, artikul: str, session: AsyncSession, marketplace: str | None = None
+    ) -> int | None:
+        """
+        id товара по артикулу. Сначала проверяется индекс в памяти,
+        в базу данных запрос идет только при промахе.
+
+        Args:
+            marketplace: Маркетплейс товара. По умолчанию, как и
+                get_product_by_artikul, подходит товар любого маркетплейса
+        """
+        product_id = self.index.get(marketplace, artikul)
+        if product_id is not None:
+            return product_id
+        try:
+            query = select(ProductModel.id).where(ProductModel.artikul == artikul)
+            if marketplace is not None:
+                query = query.where(ProductModel.marketplace == marketplace)
+            result = await session.execute(query.order_by(ProductModel.id).limit(1))
+            product_id = result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error get product id: {e}")
+            raise e
+        if product_id is not None:
+            self.index.set(marketplace, artikul, product_id)
+        return product_id
+
+    async def warm_index(self, marketplace: str, session: AsyncSession) -> int:
+        """
+        Заполняет индекс id товаров из каталога (не больше размера индекса).
+
+        Returns:
+            int: Число загруженных записей
+        """
+        loaded = 0
+        async for row in self.stream_products_from_marketplace(marketplace, session):
+            if loaded >= self.index.max_size:
+                break
+            self.index.set(marketplace, row.artikul, row.id)
+            loaded += 1
+        return loaded
+
+    async def get_products_by_artikuls(
+        self, marketplace: str, artikuls: list[str], session: AsyncSession
+    ) -> list[ProductModel]:
+        try:
+            result = await session.execute(
+                select(ProductModel).where(
+                    ProductModel.marketplace == marketplace,
+                    ProductModel.artikul.in_(artikuls),
+                )
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error get products by artikuls: {e}")
+            raise e
+
     async def delete_product_by_artikul(
         self, artikul: str, session: AsyncSession
     ) -> ProductModel:
@@ -170,6 +435,7 @@ class ProductRepository:
             product = result.scalars().first()
             session.delete(product)
             await session.commit()
+            self.index.invalidate(product.marketplace, product.artikul)
             return product
         except Exception as e:
             logger.error(f"Error delete product by artikul: {e}")
@@ -185,9 +451,20 @@ class ProductRepository:
 
     async def add_product_history(
         self, artikul: str, product_history: ProductHistoryShema, session: AsyncSession
-    ) -> ProductModel:
+    ) -> ProductHistoryModel:
         try:
-            product_id = (await self.get_product_by_artikul(artikul, session)).id
+            product_id = await self.get_product_id(artikul, session)
+            snapshots = {product_id: product_history}
+            await self._upsert_latest(snapshots, session)
+            unchanged = None
+            if self.storage_mode == "interval":
+                unchanged = await self.get_unchanged_products(snapshots, session)
+            if await self._extend_unchanged_history(snapshots, session, unchanged):
+                await session.commit()
+                # Возвращается продленная строка истории с новым valid_to
+                return await session.get(
+                    ProductHistoryModel, unchanged[product_id], populate_existing=True
+                )
             product_history_dumb = product_history.model_dump()
             product_history_dumb["product_id"] = product_id
             product_history = ProductHistoryModel(**product_history_dumb)
@@ -198,25 +475,120 @@ class ProductRepository:
             logger.error(f"Error add product history: {e}")
             raise e
 
+    async def add_products_history_bulk(
+        self,
+        snapshots: dict[int, ProductHistoryShema],
+        session: AsyncSession,
+        chunk_size: int = 1000,
+        unchanged: dict[int, int] | None = None,
+    ) -> dict[int, str]:
+        """
+        Добавляет историю нескольких товаров многострочными INSERT.
+
+        Если пакет не записался целиком, строки записываются по одной
+        в отдельных savepoint, чтобы ошибочная строка не отменяла остальные.
+        В режиме interval для неизменившихся товаров только продлевается
+        valid_to текущей строки, тоже с откатом до отдельных строк. product_latest обновляется в тех же savepoint,
+        что и история. Фиксацию транзакции выполняет вызывающий код.
+
+        Args:
+            snapshots: Данные о товарах по id товара
+            chunk_size: Максимальное число строк в одном INSERT
+            unchanged: Результат get_unchanged_products, если уже получен
+
+        Returns:
+            dict[int, str]: Ошибки записи по id товара
+        """
+        if self.storage_mode != "interval":
+            unchanged = {}
+        elif unchanged is None:
+            unchanged = await self.get_unchanged_products(snapshots, session)
+
+        async def extend(product_ids: list[int]):
+            await self._extend_unchanged_history(
+                {product_id: snapshots[product_id] for product_id in product_ids},
+                session,
+                {product_id: unchanged[product_id] for product_id in product_ids},
+            )
+            await self._upsert_latest(
+                {product_id: snapshots[product_id] for product_id in product_ids},
+                session,
+            )
+
+        async def insert_history(product_ids: list[int]):
+            await session.execute(
+                insert(ProductHistoryModel).values(
+                    [
+                        {**snapshots[product_id].model_dump(), "product_id": product_id}
+                        for product_id in product_ids
+                    ]
+                )
+            )
+            await self._upsert_latest(
+                {product_id: snapshots[product_id] for product_id in product_ids},
+                session,
+            )
+
+        failures = await self._write_with_fallback(list(unchanged), extend, session)
+        rows = [product_id for product_id in snapshots if product_id not in unchanged]
+        for i in range(0, len(rows), chunk_size):
+            failures.update(
+                await self._write_with_fallback(
+                    rows[i : i + chunk_size], insert_history, session
+                )
+            )
+        return failures
+
+    @staticmethod
+    async def _write_with_fallback(
+        product_ids: list[int],
+        write: Callable[[list[int]], Awaitable[None]],
+        session: AsyncSession,
+    ) -> dict[int, str]:
+        """
+        Выполняет запись товаров в одном savepoint, а если она не удалась,
+        повторяет ее для каждого товара в отдельном savepoint, чтобы
+        ошибочная строка не отменяла остальные.
+
+        Returns:
+            dict[int, str]: Ошибки записи по id товара
+        """
+        if not product_ids:
+            return {}
+        try:
+            async with session.begin_nested():
+                await write(product_ids)
+            return {}
+        except Exception as e:
+            logger.warning(f"Bulk write of product history failed: {e}")
+
+        failures = {}
+        for product_id in product_ids:
+            try:
+                async with session.begin_nested():
+                    await write([product_id])
+            except Exception as e:
+                logger.error(f"Error add product history for product {product_id}: {e}")
+                failures[product_id] = str(e)
+        return failures
+
     async def get_last_product_history_by_artikul(
         self, artikul: str, session: AsyncSession
-    ) -> ProductHistoryModel:
+    ) -> ProductLatestModel:
         try:
             # result = await session.execute(
             #     select(ProductHistoryModel)
             #     .where(ProductHistoryModel.artikul == artikul)
             #     .order_by(ProductHistoryModel.created_at.desc())
             # )
-            result = await session.execute(
-                select(ProductHistoryModel)
-                .join(ProductModel, ProductModel.id == ProductHistoryModel.product_id)
-                .filter(ProductModel.artikul == artikul)
-                .order_by(ProductHistoryModel.created_at.desc())
-            )
+            product_id = await self.get_product_id(artikul, session)
+            result = None
+            if product_id is not None:
+                result = await session.get(ProductLatestModel, product_id)
 
-            if not (result := result.scalars().first()):
+            if not result:
                 logger.error(
-                    f"Product history with artikul {artikul} not found in ProductHistory table"
+                    f"Product history with artikul {artikul} not found in ProductLatest table"
                 )
                 return
                 
@@ -225,22 +597,110 @@ class ProductRepository:
             logger.error(f"Error get last product history by artikul: {e}")
             raise e
 
+    async def get_product_snapshot(
+        self, artikul: str, session: AsyncSession
+    ) -> dict | None:
+        """
+        Последние сохраненные данные о товаре в формате WildberriesAPIClient.
+        """
+        try:
+            product = await self.get_product_by_artikul(artikul, session)
+            if not product:
+                return None
+            product_data = await self.get_last_product_history_by_artikul(
+                artikul, session
+            )
+            if not product_data:
+                return None
+            return {
+                "artikul": product.artikul,
+                "name": product.name,
+                "standart_price": product_data.standart_price,
+                "sell_price": product_data.sell_price,
+                "total_quantity": product_data.total_quantity,
+                "rating": product_data.rating,
+            }
+        except Exception as e:
+            logger.error(f"Error get product snapshot: {e}")
+            raise e
+
     async def get_lasted_products_by_artikul(
         self, artikul: str, count: int, session: AsyncSession
     ) -> list[ProductHistoryModel]:
         try:
+            product_id = await self.get_product_id(artikul, session)
             result = await session.execute(
                 select(ProductHistoryModel)
-                .join(ProductModel, ProductHistoryModel.product_id == ProductModel.id)
-                .where(ProductModel.artikul == artikul)
+                .where(ProductHistoryModel.product_id == product_id)
                 .order_by(ProductHistoryModel.created_at.desc())
                 .limit(count)
             )
-            return result.scalars().all()
+            return self._expand_intervals(result.scalars().all(), count)
         except Exception as e:
             logger.error(f"Error get lasted products by artikul: {e}")
             raise e
 
+    async def get_product_history_range(
+        self,
+        artikul: str,
+        date_from: datetime,
+        date_to: datetime,
+        session: AsyncSession,
+        limit: int = 100,
+    ) -> list[ProductHistoryModel] | None:
+        """
+        История товара за период [date_from, date_to) от новых записей
+        к старым. Следующая страница запрашивается с date_to, равным
+        created_at последней полученной записи.
+
+        Args:
+            artikul: Артикул товара
+            date_from: Начало периода (включительно)
+            date_to: Конец периода (не включительно)
+            limit: Максимальное число записей
+
+        Returns:
+            list[ProductHistoryModel] | None: Записи истории или None,
+                если товар не найден
+        """
+        try:
+            product_id = await self.get_product_id(artikul, session)
+            if product_id is None:
+                return None
+
+            # Обе выборки идут по индексу (product_id, created_at DESC)
+            query = select(ProductHistoryModel).where(
+                ProductHistoryModel.product_id == product_id
+            )
+            result = await session.execute(
+                query.where(
+                    ProductHistoryModel.created_at >= date_from,
+                    ProductHistoryModel.created_at < date_to,
+                )
+                .order_by(ProductHistoryModel.created_at.desc())
+                .limit(limit)
+            )
+            rows = list(result.scalars().all())
+
+            # В режиме interval начало периода может приходиться на строку,
+            # созданную раньше date_from и продленную через valid_to
+            if self.storage_mode == "interval" and len(rows) < limit:
+                result = await session.execute(
+                    query.where(ProductHistoryModel.created_at < date_from)
+                    .order_by(ProductHistoryModel.created_at.desc())
+                    .limit(1)
+                )
+                row = result.scalars().first()
+                if row and row.valid_to is not None and row.valid_to >= date_from:
+                    rows.append(row)
+
+            return self._expand_intervals(
+                rows, limit, since=date_from, before=date_to
+            )
+        except Exception as e:
+            logger.error(f"Error get product history range: {e}")
+            raise e
+
     async def get_products_paginated(
         self,
         session: AsyncSession,
@@ -259,8 +719,19 @@ class ProductRepository:
 
             if search_query:
                 similarity = func.similarity(ProductModel.name, search_query)
+                # Последняя строка истории товара выбирается тем же запросом
+                # (LATERAL по индексу product_id, created_at DESC)
+                history = aliased(
+                    ProductHistoryModel,
+                    select(ProductHistoryModel)
+                    .where(ProductHistoryModel.product_id == ProductModel.id)
+                    .order_by(ProductHistoryModel.created_at.desc())
+                    .limit(1)
+                    .lateral(),
+                )
                 base_query = (
-                    base_query.add_columns(similarity.label("similarity"))
+                    base_query.add_columns(history, similarity.label("similarity"))
+                    .outerjoin(history, true())
                     .where(similarity >= min_similarity)
                     .order_by(
                         ProductModel.artikul, desc("similarity")
@@ -274,20 +745,18 @@ class ProductRepository:
             result = await session.execute(query)
 
             if search_query:
-                rows = result.all()  # Получаем все строки один раз
-                response = []
-                for product, similarity in rows:
-                    product_data = await self.get_last_product_history_by_artikul(
-                        artikul=product.artikul, session=session
-                    )
-                    response.append(
-                        {
-                            "product": product,
-                            "product_data": product_data,
-                            "similarity": similarity,
-                        }
-                    )
-                return response
+                return [
+                    {
+                        "product": product,
+                        "product_data": (
+                            self._expand_intervals([product_data], 1)[0]
+                            if product_data
+                            else None
+                        ),
+                        "similarity": similarity,
+                    }
+                    for product, product_data, similarity in result.all()
+                ]
             else:
                 return result.scalars().all()
 
@@ -296,13 +765,262 @@ class ProductRepository:
             raise e
 
     async def get_all_products_from_marketplace(
-        self, marketplace: str, session: AsyncSession
+        self,
+        marketplace: str,
+        session: AsyncSession,
+        shards: list[int] | None = None,
+        shard_count: int | None = None,
+        partition: tuple[int, int] | None = None,
+        subscribed_only: bool = False,
     ):
         try:
-            result = await session.execute(
-                select(ProductModel).where(ProductModel.marketplace == marketplace)
-            )
+            query = select(ProductModel).where(ProductModel.marketplace == marketplace)
+            query = self._filter_scope(query, shards, shard_count, partition)
+            if subscribed_only:
+                query = query.where(self._has_subscribers())
+            result = await session.execute(query)
             return result.scalars().all()
         except Exception as e:
             logger.error(f"Error get all subscribes from marketplace: {e}")
             raise e
+
+    async def stream_products_from_marketplace(
+        self,
+        marketplace: str,
+        session: AsyncSession,
+        after_id: int = 0,
+        chunk_size: int = PRODUCT_STREAM_CHUNK_SIZE,
+        shards: list[int] | None = None,
+        shard_count: int | None = None,
+        partition: tuple[int, int] | None = None,
+        subscribed_only: bool = False,
+    ) -> AsyncIterator:
+        """
+        Читает каталог пакетами по возрастанию id (keyset) и отдает
+        легкие строки (id, artikul), не загружая весь каталог в память.
+
+        Args:
+            marketplace: Маркетплейс
+            after_id: Отдавать товары с id больше указанного
+            chunk_size: Число товаров в одном запросе
+        """
+        last_id = after_id
+        while True:
+            query = (
+                select(ProductModel.id, ProductModel.artikul)
+                .where(
+                    ProductModel.marketplace == marketplace,
+                    ProductModel.id > last_id,
+                )
+                .order_by(ProductModel.id)
+                .limit(chunk_size)
+            )
+            query = self._filter_scope(query, shards, shard_count, partition)
+            if subscribed_only:
+                query = query.where(self._has_subscribers())
+            try:
+                result = await session.execute(query)
+                rows = result.all()
+                # Читающая транзакция не остается открытой между пакетами
+                await session.commit()
+            except Exception as e:
+                logger.error(f"Error stream products from marketplace: {e}")
+                raise e
+
+            for row in rows:
+                yield row
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1].id
+
+    @staticmethod
+    def _filter_scope(
+        query,
+        shards: list[int] | None,
+        shard_count: int | None,
+        partition: tuple[int, int] | None,
+    ):
+        """
+        Ограничивает выборку товаров шардами аренд (product_id % shard_count)
+        и разделом процесса загрузки (hash(artikul) % число процессов).
+        """
+        if shards is not None:
+            query = query.where((ProductModel.id % shard_count).in_(shards))
+        if partition is not None:
+            index, count = partition
+            artikul_hash = func.hashtext(ProductModel.artikul).op("&")(2147483647)
+            query = query.where(artikul_hash % count == index)
+        return query
+
+    @staticmethod
+    def _has_subscribers():
+        return (
+            select(UserSubsToProductModel.id)
+            .where(UserSubsToProductModel.product_id == ProductModel.id)
+            .exists()
+        )
+
+    def _subscribers_count(self):
+        return (
+            select(
+                UserSubsToProductModel.product_id,
+                func.count(UserSubsToProductModel.id).label("subscribers"),
+            )
+            .group_by(UserSubsToProductModel.product_id)
+            .subquery()
+        )
+
+    async def get_due_products(
+        self,
+        marketplace: str,
+        session: AsyncSession,
+        limit: int | None = None,
+        shards: list[int] | None = None,
+        shard_count: int | None = None,
+        partition: tuple[int, int] | None = None,
+        subscribed_only: bool = False,
+        tolerance: float = POLL_DUE_TOLERANCE_SECONDS,
+    ):
+        """
+        Товары, время опроса которых наступило, в порядке приоритета:
+        сначала ни разу не опрошенные, затем по числу подписчиков
+        и по времени просрочки.
+
+        Args:
+            marketplace: Маркетплейс
+            limit: Максимальное число товаров
+            shards: Шарды (product_id % shard_count), None - все товары
+            shard_count: Общее число шардов
+            partition: Номер раздела процесса загрузки и число разделов
+            subscribed_only: Только товары, на которые есть подписки
+            tolerance: Допуск в секундах, с которым время опроса
+                считается наступившим
+
+        Returns:
+            list[Row]: id и артикулы товаров для опроса
+        """
+        try:
+            subscribers = self._subscribers_count()
+            next_poll_at = ProductPollScheduleModel.next_poll_at
+            query = (
+                select(ProductModel.id, ProductModel.artikul)
+                .outerjoin(
+                    ProductPollScheduleModel,
+                    ProductPollScheduleModel.product_id == ProductModel.id,
+                )
+                .outerjoin(subscribers, subscribers.c.product_id == ProductModel.id)
+                .where(
+                    ProductModel.marketplace == marketplace,
+                    (next_poll_at.is_(None))
+                    | (next_poll_at <= func.now() + timedelta(seconds=tolerance)),
+                )
+                .order_by(
+                    next_poll_at.is_(None).desc(),
+                    func.coalesce(subscribers.c.subscribers, 0).desc(),
+                    next_poll_at.asc(),
+                )
+            )
+            query = self._filter_scope(query, shards, shard_count, partition)
+            if subscribed_only:
+                query = query.where(self._has_subscribers())
+            if limit:
+                query = query.limit(limit)
+            result = await session.execute(query)
+            return result.all()
+        except Exception as e:
+            logger.error(f"Error get due products: {e}")
+            raise e
+
+    async def update_poll_schedule(
+        self,
+        changes: dict[int, bool],
+        session: AsyncSession,
+        failed: Iterable[int] = (),
+    ):
+        """
+        Пересчитывает время следующего опроса товаров.
+        Фиксацию транзакции выполняет вызывающий код.
+
+        Товар, опрос которого не удался, откладывается с интервалом,
+        растущим с числом неудач подряд, иначе без next_poll_at он
+        выбирался бы первым в каждом цикле.
+
+        Args:
+            changes: Изменились ли данные товара при опросе, по id товара
+            failed: id товаров, данные которых не получены или не записаны
+        """
+        failed = set(failed) - set(changes)
+        if not changes and not failed:
+            return
+        try:
+            subscribers = self._subscribers_count()
+            result = await session.execute(
+                select(
+                    ProductModel.id,
+                    ProductPollScheduleModel.unchanged_streak,
+                    ProductPollScheduleModel.failure_streak,
+                    func.coalesce(subscribers.c.subscribers, 0),
+                )
+                .outerjoin(
+                    ProductPollScheduleModel,
+                    ProductPollScheduleModel.product_id == ProductModel.id,
+                )
+                .outerjoin(subscribers, subscribers.c.product_id == ProductModel.id)
+                .where(ProductModel.id.in_([*changes, *failed]))
+            )
+            rows = []
+            for product_id, streak, failures, subscribers_count in result.all():
+                if product_id in failed:
+                    failures = (failures or 0) + 1
+                    interval = compute_next_interval(failures, subscribers_count)
+                    rows.append(
+                        {
+                            "product_id": product_id,
+                            "next_poll_at": func.now() + timedelta(seconds=interval),
+                            "interval_seconds": interval,
+                            "unchanged_streak": streak or 0,
+                            "failure_streak": failures,
+                            "last_polled_at": None,
+                            "last_changed_at": None,
+                        }
+                    )
+                    continue
+                changed = changes[product_id]
+                streak = 0 if changed else (streak or 0) + 1
+                interval = compute_next_interval(streak, subscribers_count)
+                rows.append(
+                    {
+                        "product_id": product_id,
+                        "next_poll_at": func.now() + timedelta(seconds=interval),
+                        "interval_seconds": interval,
+                        "unchanged_streak": streak,
+                        "failure_streak": 0,
+                        "last_polled_at": func.now(),
+                        "last_changed_at": func.now() if changed else None,
+                    }
+                )
+            if not rows:
+                return
+            stmt = insert(ProductPollScheduleModel).values(rows)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ProductPollScheduleModel.product_id],
+                    set_={
+                        "next_poll_at": stmt.excluded.next_poll_at,
+                        "interval_seconds": stmt.excluded.interval_seconds,
+                        "unchanged_streak": stmt.excluded.unchanged_streak,
+                        "failure_streak": stmt.excluded.failure_streak,
+                        "last_polled_at": func.coalesce(
+                            stmt.excluded.last_polled_at,
+                            ProductPollScheduleModel.last_polled_at,
+                        ),
+                        "last_changed_at": func.coalesce(
+                            stmt.excluded.last_changed_at,
+                            ProductPollScheduleModel.last_changed_at,
+                        ),
+                    },
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error update poll schedule: {e}")
+            raise e
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+
+
+class AdaptiveRateLimiter:
+    """
+    Адаптивный ограничитель частоты запросов на основе token bucket.
+
+    Скорость снижается в decrease_factor раз при ответах 429/5xx и плавно
+    растет на increase_step запросов в секунду после каждого успешного
+    запроса, оставаясь в пределах [min_rate, max_rate]. Заголовок
+    Retry-After блокирует выдачу токенов до истечения указанного времени.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        min_rate: float = 1.0,
+        max_rate: float = 50.0,
+        burst: int = 10,
+        increase_step: float = 0.1,
+        decrease_factor: float = 0.5,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """
+        Ожидает, пока можно будет выполнить очередной запрос.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        """
+        Плавно увеличивает скорость после успешного запроса.
+        """
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        Снижает скорость после ответа 429/5xx.
+
+        Args:
+            retry_after: Время в секундах из заголовка Retry-After
+        """
+        now = time.monotonic()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        # Токены не накапливаются, пока действует блокировка
+        self._tokens = 0.0
+        self._updated_at = max(now, self._blocked_until)
+
+        # Пачка одновременных отказов снижает скорость только один раз
+        if now - self._last_decrease < 1 / self.rate:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        logger.warning(
+            f"Wildberries rate limit lowered to {self.rate:.2f} req/s "
+            f"(retry_after={retry_after})"
+        )
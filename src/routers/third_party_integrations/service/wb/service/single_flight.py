@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один.
+
+    Пока вызов по ключу выполняется, остальные вызывающие ждут
+    его результат вместо запуска собственного.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Помечаем исключение полученным, даже если все ожидающие отменены
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет func или присоединяется к уже выполняемому вызову по ключу.
+
+        Args:
+            key: Ключ объединения вызовов
+            func: Фабрика корутины, выполняющей вызов
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        # Отмена одного ожидающего не отменяет общий вызов
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,80 @@
+"""
+Быстрый разбор ответа card.wb.ru.
+
+Ответ декодируется msgspec сразу в типизированные структуры, содержащие
+только нужные поля: остальные поля карточки (цвета, промо, параметры
+складов и т.д.) пропускаются декодером без создания Python-объектов.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import msgspec
+from loguru import logger
+
+
+class _Stock(msgspec.Struct):
+    qty: int = 0
+
+
+class _Size(msgspec.Struct):
+    stocks: List[_Stock] = []
+
+
+class _Product(msgspec.Struct):
+    id: int
+    name: Optional[str] = None
+    priceU: Optional[int] = None
+    salePriceU: Optional[int] = None
+    reviewRating: Optional[float] = None
+    sizes: List[_Size] = []
+
+
+class _Data(msgspec.Struct):
+    products: List[_Product] = []
+
+
+class _Payload(msgspec.Struct):
+    data: _Data = msgspec.field(default_factory=_Data)
+
+
+_decoder = msgspec.json.Decoder(_Payload, strict=False)
+
+
+def _to_record(product: _Product) -> Dict[str, Any]:
+    if product.priceU is None or product.salePriceU is None:
+        logger.debug(
+            f"Missing price data for artikul {product.id}. "
+            f"priceU: {product.priceU}, salePriceU: {product.salePriceU}"
+        )
+
+    standart_price = (product.priceU / 100) if product.priceU is not None else 0.0
+    sell_price = (
+        (product.salePriceU / 100) if product.salePriceU is not None else 0.0
+    )
+    total_quantity = sum(stock.qty for size in product.sizes for stock in size.stocks)
+
+    return {
+        "artikul": str(product.id),
+        "name": str(product.name),
+        "standart_price": float(standart_price),
+        "sell_price": float(sell_price),
+        "total_quantity": int(total_quantity),
+        "rating": float(product.reviewRating or 0.0),
+    }
+
+
+def decode_products(raw: bytes) -> List[Dict[str, Any]]:
+    """
+    Разбирает тело ответа card.wb.ru в список компактных записей о товарах.
+
+    Args:
+        raw (bytes): Тело ответа API
+
+    Returns:
+        List[Dict[str, Any]]: Данные о товарах в формате
+        WildberriesAPIClient.fetch_product_details
+
+    Raises:
+        msgspec.DecodeError: Если ответ не соответствует ожидаемой схеме
+    """
+    return [_to_record(product) for product in _decoder.decode(raw).data.products]
@@ -1,113 +1,480 @@
 import aiohttp
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional
 from loguru import logger
+from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import asyncio
+import os
+import random
+import time
+
+import msgspec
+
+from routers.third_party_integrations.service.wb.service.rate_limiter import (
+    AdaptiveRateLimiter,
+)
+from routers.third_party_integrations.service.wb.service.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+)
+from routers.third_party_integrations.service.wb.service.product_cache import (
+    ProductCache,
+)
+from routers.third_party_integrations.service.wb.service.single_flight import (
+    SingleFlight,
+)
+from routers.third_party_integrations.service.wb.service.wb_payload import (
+    decode_products,
+)
+from routers.third_party_integrations.service.wb.service.metrics import (
+    WildberriesClientMetrics,
+)
+from redis_client import RedisClient
+
+load_dotenv()
+
+# Настройки пула соединений к API Wildberries
+WB_POOL_LIMIT = int(os.getenv("WB_POOL_LIMIT", 100))
+WB_POOL_LIMIT_PER_HOST = int(os.getenv("WB_POOL_LIMIT_PER_HOST", 20))
+WB_KEEPALIVE_TIMEOUT = float(os.getenv("WB_KEEPALIVE_TIMEOUT", 30))
+WB_DNS_CACHE_TTL = int(os.getenv("WB_DNS_CACHE_TTL", 300))
+
+# Адрес API карточек товаров (можно указать локальную заглушку)
+WB_BASE_URL = os.getenv("WB_BASE_URL", "https://card.wb.ru/cards/v1/detail")
+
+# Коды регионов доставки (dest) через запятую, первый используется для цен
+WB_DESTINATIONS = [
+    dest.strip()
+    for dest in os.getenv("WB_DESTINATIONS", "-1257786").split(",")
+    if dest.strip()
+]
+
+# Настройки пакетных запросов
+WB_BATCH_SIZE = int(os.getenv("WB_BATCH_SIZE", 100))
+WB_MAX_CONCURRENT_REQUESTS = int(os.getenv("WB_MAX_CONCURRENT_REQUESTS", 10))
+
+# Настройки адаптивного ограничения частоты запросов (запросов в секунду)
+WB_RATE_LIMIT = float(os.getenv("WB_RATE_LIMIT", 10))
+WB_RATE_LIMIT_MIN = float(os.getenv("WB_RATE_LIMIT_MIN", 1))
+WB_RATE_LIMIT_MAX = float(os.getenv("WB_RATE_LIMIT_MAX", 50))
+WB_RATE_LIMIT_BURST = int(os.getenv("WB_RATE_LIMIT_BURST", 10))
+# Доля общего бюджета запросов, которую использует процесс. Лимиты выше
+# задают бюджет всего приложения, а процессы API и scheduler.ingest
+# получают свою долю, чтобы вместе не превышать его
+WB_RATE_LIMIT_SHARE = float(os.getenv("WB_RATE_LIMIT_SHARE", 1))
+
+# Настройки повторных попыток (экспоненциальная задержка с jitter)
+WB_MAX_RETRIES = int(os.getenv("WB_MAX_RETRIES", 3))
+WB_RETRY_BASE_DELAY = float(os.getenv("WB_RETRY_BASE_DELAY", 0.5))
+WB_RETRY_MAX_DELAY = float(os.getenv("WB_RETRY_MAX_DELAY", 10))
+
+# Настройки автоматического выключателя
+WB_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("WB_CIRCUIT_FAILURE_THRESHOLD", 5))
+WB_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("WB_CIRCUIT_RECOVERY_TIMEOUT", 30))
+
+# Настройки кэша данных о товарах в Redis (в секундах)
+WB_CACHE_ENABLED = os.getenv("WB_CACHE_ENABLED", "1") == "1"
+WB_CACHE_TTL = int(os.getenv("WB_CACHE_TTL", 300))
+WB_CACHE_STALE_TTL = int(os.getenv("WB_CACHE_STALE_TTL", 3600))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разбирает заголовок Retry-After (секунды или HTTP-дата).
+
+    Returns:
+        Optional[float]: Время ожидания в секундах или None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
 
 
 class WildberriesAPIClient:
     """
     Клиент для работы с API Wildberries.
     Обрабатывает запросы к API с повторными попытками и таймаутами.
+
+    Клиент владеет одной долгоживущей HTTP-сессией с пулом соединений,
+    которая открывается методом start() и закрывается методом close().
     """
 
-    def __init__(self):
-        self.base_url = "https://card.wb.ru/cards/v1/detail"
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url or WB_BASE_URL
         self.app_type = 1
         self.currency = "rub"
-        self.destination = "-1257786"
+        self.destinations = WB_DESTINATIONS
+        self.destination = self.destinations[0]
         self.sp = 30
-        self.max_retries = 3  # Максимальное количество попыток
-        self.retry_delay = 2  # Задержка между попытками в секундах
+        self.max_retries = WB_MAX_RETRIES  # Максимальное количество попыток
+        self.retry_base_delay = WB_RETRY_BASE_DELAY  # Базовая задержка в секундах
+        self.retry_max_delay = WB_RETRY_MAX_DELAY  # Максимальная задержка в секундах
         self.timeout = 30  # Таймаут запроса в секундах
+        self.batch_size = WB_BATCH_SIZE  # Артикулов в одном запросе
+        # Ограничение одновременных запросов к API
+        self._semaphore = asyncio.Semaphore(WB_MAX_CONCURRENT_REQUESTS)
+        # Общий для всех вызовов процесса ограничитель частоты запросов
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=WB_RATE_LIMIT * WB_RATE_LIMIT_SHARE,
+            min_rate=WB_RATE_LIMIT_MIN * WB_RATE_LIMIT_SHARE,
+            max_rate=WB_RATE_LIMIT_MAX * WB_RATE_LIMIT_SHARE,
+            burst=max(1, int(WB_RATE_LIMIT_BURST * WB_RATE_LIMIT_SHARE)),
+        )
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=WB_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=WB_CIRCUIT_RECOVERY_TIMEOUT,
+        )
+        self.cache = ProductCache(
+            RedisClient(),
+            ttl=WB_CACHE_TTL,
+            stale_ttl=WB_CACHE_STALE_TTL,
+            enabled=WB_CACHE_ENABLED,
+        )
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        # Одновременные запросы одного артикула выполняются одним запросом
+        self._single_flight = SingleFlight()
+        self.metrics = WildberriesClientMetrics()
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    async def fetch_product_details(self, artikul: str) -> Optional[Dict[str, Any]]:
+    async def start(self) -> aiohttp.ClientSession:
         """
-        Получает детали товара с повторными попытками при ошибках.
+        Открывает общую HTTP-сессию, если она еще не открыта.
+
+        Returns:
+            aiohttp.ClientSession: Общая сессия клиента
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=WB_POOL_LIMIT,
+                limit_per_host=WB_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=WB_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=WB_DNS_CACHE_TTL,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            logger.info(
+                f"Wildberries HTTP session opened (limit={WB_POOL_LIMIT}, "
+                f"limit_per_host={WB_POOL_LIMIT_PER_HOST})"
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Закрывает общую HTTP-сессию и освобождает соединения пула.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Wildberries HTTP session closed")
+        self._session = None
+
+    def _build_url(self, nm: str, dest: Optional[str] = None) -> str:
+        """
+        Формирует URL запроса карточек товаров.
 
         Args:
-            artikul (str): Артикул товара
+            nm (str): Один или несколько артикулов, разделенных ";"
+            dest (Optional[str]): Код региона доставки, по умолчанию основной
+        """
+        return (
+            f"{self.base_url}?appType={self.app_type}&curr={self.currency}"
+            f"&dest={dest or self.destination}&sp={self.sp}&nm={nm}"
+        )
+
+    def _retry_delay(self, attempt: int) -> float:
+        """
+        Экспоненциальная задержка перед повторной попыткой с full jitter.
+
+        Args:
+            attempt (int): Номер неудачной попытки, начиная с 0
+        """
+        return random.uniform(
+            0, min(self.retry_max_delay, self.retry_base_delay * 2**attempt)
+        )
+
+    async def _request_products(
+        self, nm: str, dest: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Запрашивает карточки товаров с повторными попытками при ошибках.
+
+        Args:
+            nm (str): Один или несколько артикулов, разделенных ";"
+            dest (Optional[str]): Код региона доставки, по умолчанию основной
 
         Returns:
-            Optional[Dict[str, Any]]: Данные о товаре или None при ошибке
+            Optional[List[Dict[str, Any]]]: Данные о товарах из ответа API
+            или None, если все попытки завершились ошибкой
+
+        Raises:
+            CircuitBreakerOpenError: Если цепь разомкнута и запрос не выполнялся
         """
-        url = f"{self.base_url}?appType={self.app_type}&curr={self.currency}&dest={self.destination}&sp={self.sp}&nm={artikul}"
-
-        for attempt in range(self.max_retries):
-            try:
-                logger.debug(
-                    f"Запрос данных для артикула: {artikul} (попытка {attempt + 1}/{self.max_retries})"
-                )
-                timeout = aiohttp.ClientTimeout(total=self.timeout)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            products = data.get("data", {}).get("products", [])
-                            if products:
-                                product = products[0]
-                                artikul = product.get("id")
-                                name = product.get("name")
-                                price_u = product.get("priceU")
-                                sale_price_u = product.get("salePriceU")
-                                rating = product.get("reviewRating", 0.0)
-
-                                if price_u is None or sale_price_u is None:
-                                    logger.debug(
-                                        f"Missing price data for artikul {artikul}. "
-                                        f"priceU: {price_u}, salePriceU: {sale_price_u}"
-                                    )
-
-                                standart_price = (
-                                    (price_u / 100) if price_u is not None else 0.0
-                                )
-                                sell_price = (
-                                    (sale_price_u / 100)
-                                    if sale_price_u is not None
-                                    else 0.0
+        url = self._build_url(nm, dest)
+        outcome = "failed"
+        attempts = 0
+        try:
+            for attempt in range(self.max_retries):
+                # Разомкнутая цепь отклоняет запрос без ожидания очереди
+                if self.circuit_breaker.state == CircuitBreaker.OPEN:
+                    outcome = "circuit_open"
+                    raise CircuitBreakerOpenError(
+                        f"Wildberries API недоступен, запрос {nm} отклонен"
+                    )
+                retry_after = None
+                probe = False
+                try:
+                    logger.debug(
+                        f"Запрос данных для артикула: {nm} (попытка {attempt + 1}/{self.max_retries})"
+                    )
+                    session = await self.start()
+                    async with self._semaphore:
+                        await self.rate_limiter.acquire()
+                        # Слот пробного запроса занимается только перед
+                        # самим запросом, после ожидания очереди
+                        if not self.circuit_breaker.allow_request():
+                            outcome = "circuit_open"
+                            raise CircuitBreakerOpenError(
+                                f"Wildberries API недоступен, запрос {nm} отклонен"
+                            )
+                        probe = self.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+                        attempts += 1
+                        started = time.perf_counter()
+                        async with session.get(url) as response:
+                            self.metrics.record_attempt(
+                                str(response.status), time.perf_counter() - started
+                            )
+                            if response.status == 200:
+                                raw = await response.read()
+                                self.rate_limiter.on_success()
+                                decode_started = time.perf_counter()
+                                products = decode_products(raw)
+                                # Успех засчитывается только после разбора ответа
+                                self.circuit_breaker.record_success()
+                                self.metrics.record_body(
+                                    len(raw), time.perf_counter() - decode_started
                                 )
+                                outcome = "success"
+                                return products
 
-                                sizes = product.get("sizes", [])
-                                total_quantity = 0
-                                for size in sizes:
-                                    total_quantity += sum(
-                                        item.get("qty", 0)
-                                        for item in size.get("stocks", [])
-                                    )
-
-                                return {
-                                    "artikul": str(artikul),
-                                    "name": str(name),
-                                    "standart_price": float(standart_price),
-                                    "sell_price": float(sell_price),
-                                    "total_quantity": int(total_quantity),
-                                    "rating": float(rating),
-                                }
-                        else:
                             logger.error(
-                                f"Failed to fetch product details for artikul: {artikul}. "
+                                f"Failed to fetch product details for artikul: {nm}. "
                                 f"Status code: {response.status}"
                             )
-                            if attempt < self.max_retries - 1:
-                                await asyncio.sleep(self.retry_delay)
-                                continue
-                            return None
-
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                logger.error(
-                    f"Error fetching product {artikul} (attempt {attempt + 1}/{self.max_retries}): {str(e)}"
-                )
+                            if response.status == 429 or response.status >= 500:
+                                retry_after = parse_retry_after(
+                                    response.headers.get("Retry-After")
+                                )
+                                self.rate_limiter.on_throttle(retry_after)
+                                self.circuit_breaker.record_failure()
+                            else:
+                                # Остальные 4xx не исправятся повтором запроса
+                                self.circuit_breaker.record_success()
+                                outcome = "rejected"
+                                return None
+
+                except CircuitBreakerOpenError:
+                    raise
+                except asyncio.CancelledError:
+                    # Прерванный пробный запрос не должен занимать слот
+                    if probe:
+                        self.circuit_breaker.release_probe()
+                    raise
+                except asyncio.TimeoutError as e:
+                    logger.error(
+                        f"Timeout fetching product {nm} (attempt {attempt + 1}/{self.max_retries}): {str(e)}"
+                    )
+                    self.metrics.record_attempt("timeout")
+                    self.circuit_breaker.record_failure()
+                except aiohttp.ClientError as e:
+                    logger.error(
+                        f"Error fetching product {nm} (attempt {attempt + 1}/{self.max_retries}): {str(e)}"
+                    )
+                    self.metrics.record_attempt("client_error")
+                    self.circuit_breaker.record_failure()
+                except msgspec.DecodeError as e:
+                    logger.error(
+                        f"Invalid Wildberries payload for product {nm}: {str(e)}"
+                    )
+                    self.circuit_breaker.record_failure()
+                    outcome = "decode_error"
+                    return None
+                except Exception as e:
+                    logger.exception(f"Unexpected error for product {nm}: {str(e)}")
+                    self.metrics.record_attempt("error")
+                    self.circuit_breaker.record_failure()
+                    outcome = "error"
+                    return None
+
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay)
+                    # При наличии Retry-After ожидание обеспечивает ограничитель
+                    if not retry_after:
+                        await asyncio.sleep(self._retry_delay(attempt))
+
+            return None
+        finally:
+            self.metrics.record_call(outcome, attempts)
+
+    async def fetch_product_details(self, artikul: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает детали товара с повторными попытками при ошибках.
+
+        Args:
+            artikul (str): Артикул товара
+
+        Returns:
+            Optional[Dict[str, Any]]: Данные о товаре или None при ошибке.
+            При нескольких регионах доставки содержат region_quantities
+
+        Raises:
+            CircuitBreakerOpenError: Если API недоступен и цепь разомкнута
+        """
+        artikul = str(artikul)
+        product = await self._single_flight.do(
+            artikul, lambda: self._fetch_product_details(artikul)
+        )
+        # Каждый вызывающий получает свою копию общего результата
+        return dict(product) if product else product
+
+    async def _fetch_product_details(self, artikul: str) -> Optional[Dict[str, Any]]:
+        # Тот же путь, что и у пакетного запроса, чтобы данные содержали
+        # region_quantities по всем регионам доставки
+        products = await self.fetch_products_details([artikul])
+        return products[artikul]
+
+    async def get_product_details(
+        self, artikul: str, allow_stale: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Получает детали товара из кэша, а при его отсутствии из API.
+
+        Устаревшая запись кэша возвращается сразу, а ее обновление
+        запускается в фоне.
+
+        Args:
+            artikul (str): Артикул товара
+            allow_stale (bool): Можно ли вернуть устаревшую запись. Для данных,
+                которые сохраняются в историю, нужен False: устаревшая запись
+                заменяется ответом API
+
+        Returns:
+            Optional[Dict[str, Any]]: Данные о товаре или None при ошибке
+
+        Raises:
+            CircuitBreakerOpenError: Если записи в кэше нет, а цепь разомкнута
+        """
+        artikul = str(artikul)
+        cached = await self.cache.get(artikul)
+        if cached is None:
+            return await self.fetch_product_details(artikul)
+
+        product, is_fresh = cached
+        if not is_fresh and not allow_stale:
+            return await self.fetch_product_details(artikul)
+        if not is_fresh and artikul not in self._refresh_tasks:
+            task = asyncio.create_task(self._refresh_product(artikul))
+            self._refresh_tasks[artikul] = task
+            task.add_done_callback(lambda _: self._refresh_tasks.pop(artikul, None))
+        return product
+
+    async def _refresh_product(self, artikul: str):
+        try:
+            await self.fetch_product_details(artikul)
+        except Exception as e:
+            logger.warning(f"Background refresh failed for artikul {artikul}: {e}")
+
+    async def fetch_products_details(
+        self,
+        artikuls: Iterable[str],
+        destinations: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Получает детали нескольких товаров пакетными запросами.
+
+        Артикулы разбиваются на пакеты по batch_size, каждый пакет
+        запрашивается для каждого региона доставки. Все запросы выполняются
+        параллельно (не более max_concurrent_requests одновременно).
+
+        Args:
+            artikuls (Iterable[str]): Артикулы товаров
+            destinations (Optional[Iterable[str]]): Коды регионов доставки,
+                по умолчанию WB_DESTINATIONS. Цены и total_quantity берутся
+                из первого региона.
+
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: Данные о товаре в формате
+            fetch_product_details для каждого артикула, None для артикулов,
+            которые не удалось получить. При нескольких регионах в данные
+            добавляется region_quantities: {dest: количество}
+
+        Raises:
+            CircuitBreakerOpenError: Если API недоступен и цепь разомкнута
+        """
+        artikuls = list(dict.fromkeys(str(artikul) for artikul in artikuls))
+        destinations = list(destinations or self.destinations)
+        chunks = [
+            artikuls[i : i + self.batch_size]
+            for i in range(0, len(artikuls), self.batch_size)
+        ]
+        requests = [(chunk, dest) for chunk in chunks for dest in destinations]
+        responses = await asyncio.gather(
+            *(self._request_products(";".join(chunk), dest) for chunk, dest in requests),
+            return_exceptions=True,
+        )
+        for response in responses:
+            if isinstance(response, Exception) and not isinstance(
+                response, CircuitBreakerOpenError
+            ):
+                raise response
+        # Пакеты, отклоненные выключателем, считаются не полученными
+        if responses and all(
+            isinstance(response, CircuitBreakerOpenError) for response in responses
+        ):
+            raise responses[0]
+
+        result: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(artikuls)
+        region_quantities: Dict[str, Dict[str, int]] = {
+            artikul: {} for artikul in artikuls
+        }
+        for (_, dest), products in zip(requests, responses):
+            if isinstance(products, Exception):
+                continue
+            for product in products or []:
+                if product["artikul"] not in result:
                     continue
-                return None
-            except Exception as e:
-                logger.exception(f"Unexpected error for product {artikul}: {str(e)}")
-                return None
+                region_quantities[product["artikul"]][dest] = product["total_quantity"]
+                if dest == destinations[0]:
+                    result[product["artikul"]] = product
 
-        return None
+        if len(destinations) > 1:
+            for artikul, product in result.items():
+                if product:
+                    product["region_quantities"] = region_quantities[artikul]
+        await self.cache.set_many(result)
+        return result
+
+
+# Общий экземпляр клиента для роутеров и планировщика
+wb_client = WildberriesAPIClient()
 
 
 if __name__ == "__main__":
-    client = WildberriesAPIClient()
-    response = asyncio.run(client.fetch_product_details("177241487"))
-    print(response)
+
+    async def main():
+        try:
+            return await wb_client.fetch_product_details("177241487")
+        finally:
+            await wb_client.close()
+
+    print(asyncio.run(main()))
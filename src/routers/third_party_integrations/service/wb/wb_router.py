@@ -1,6 +1,8 @@
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi import HTTPException
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,17 +10,20 @@ from sqlalchemy.exc import IntegrityError
 
 from schemas.product import ProductShema, ProductHistoryShema, ProductRequest
 from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
-    WildberriesAPIClient,
+    wb_client,
+)
+from routers.third_party_integrations.service.wb.service.circuit_breaker import (
+    CircuitBreakerOpenError,
 )
 
 from routers.third_party_integrations.service.wb.service.product_repo import (
     ProductRepository,
 )
 from database import get_session
+from database.main import async_session
 from loguru import logger
 
 router = APIRouter()
-wb_client = WildberriesAPIClient()
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/v1/auth/auth-by-username",
     scopes={
@@ -29,6 +34,31 @@ oauth2_scheme = OAuth2PasswordBearer(
 product_repository = ProductRepository()
 
 
+async def warm_product_index():
+    """
+    Загружает индекс артикул -> id товара, по которому роутеры
+    находят товары без запроса к базе данных. Вызывается при старте API.
+    """
+    try:
+        async with async_session() as session:
+            loaded = await product_repository.warm_index("wildberries", session)
+        logger.info(f"Индекс товаров загружен: {loaded} записей")
+    except Exception as e:
+        logger.error(f"Не удалось загрузить индекс товаров: {str(e)}")
+
+# Максимальное число записей истории на одной странице
+HISTORY_RANGE_MAX_LIMIT = 1000
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    Время истории хранится без часового пояса (UTC).
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 @router.get("/get-product-details/{artikul}")
 async def get_product_details(
     artikul: str,
@@ -38,12 +68,21 @@ async def get_product_details(
     """
     получить данные о товаре без добовления их в базу данных 
     """
-    product = await wb_client.fetch_product_details(artikul)
+    try:
+        product = await wb_client.get_product_details(artikul)
+    except CircuitBreakerOpenError as e:
+        # Wildberries недоступен: отдаем последние сохраненные данные
+        logger.warning(str(e))
+        snapshot = await product_repository.get_product_snapshot(artikul, session)
+        if not snapshot:
+            raise HTTPException(
+                status_code=503, detail="Wildberries API временно недоступен"
+            )
+        return snapshot
     result = product.copy()
     product["marketplace"] = "wildberries"
     product = ProductShema(**product)
-    if not (await product_repository.get_product_by_artikul(artikul, session=session)):
-        await product_repository.add_product(product, session=session)
+    await product_repository.add_product_if_not_exists(product, session=session)
 
     logger.info(f"Product {artikul} added to subscribe")
     return result
@@ -62,8 +101,15 @@ async def add_product_in_db(
     try:
         artikul = request.artikul
 
-        # 1. Получаем данные товара
-        product = await wb_client.fetch_product_details(artikul)
+        # 1. Получаем данные товара (устаревший кэш в историю не пишется)
+        try:
+            product = await wb_client.get_product_details(artikul, allow_stale=False)
+        except CircuitBreakerOpenError as e:
+            logger.warning(str(e))
+            return JSONResponse(
+                content={"error": "Wildberries API временно недоступен"},
+                status_code=503,
+            )
         if not product:
             return JSONResponse(
                 content={"error": f"Товар {artikul} не найден на Wildberries"},
@@ -85,22 +131,19 @@ async def add_product_in_db(
 
         # 3. Работа с БД
         try:
-            # Проверяем существование товара
-            existing_product = await product_repository.get_product_by_artikul(
-                artikul=artikul, session=session  # Явно передаем сессию
+            # Добавляем товар, если его еще нет
+            await product_repository.add_product_if_not_exists(
+                product=product_model, session=session  # Явно передаем сессию
             )
 
-            if not existing_product:
-                await product_repository.add_product(
-                    product=product_model, session=session  # Явно передаем сессию
-                )
-
-            # Получаем продукт с ID из БД
-            product_db = await product_repository.get_product_by_artikul(
-                artikul=artikul, session=session  # Явно передаем сессию
+            # Получаем ID продукта (из индекса, без запроса к БД)
+            product_id = await product_repository.get_product_id(
+                artikul=artikul,
+                session=session,  # Явно передаем сессию
+                marketplace="wildberries",
             )
 
-            if not product_db:
+            if not product_id:
                 raise ValueError("Товар не найден после добавления")
 
             # Добавляем историю (с явным указанием аргументов)
@@ -192,6 +235,48 @@ async def get_lasted_products_by_artikul(
         raise e
 
 
+@router.get("/get-product-history-range/{artikul}")
+async def get_product_history_range(
+    artikul: str,
+    date_from: datetime,
+    date_to: datetime,
+    limit: int = 100,
+    cursor: datetime | None = None,
+    user_id: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    история товара за период [date_from, date_to) от новых записей к старым.
+    для следующей страницы передайте next_cursor из ответа в cursor
+    """
+    date_from, date_to = to_naive_utc(date_from), to_naive_utc(date_to)
+    if cursor is not None:
+        date_to = min(date_to, to_naive_utc(cursor))
+    if date_from >= date_to and cursor is None:
+        raise HTTPException(
+            status_code=400, detail="Начало периода должно быть раньше конца"
+        )
+    if not 0 < limit <= HISTORY_RANGE_MAX_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail="Превышено максимальное количество записей для анализа",
+        )
+    try:
+        result = await product_repository.get_product_history_range(
+            artikul, date_from, date_to, session, limit
+        )
+    except Exception as e:
+        logger.error(f"Error get product history range: {str(e)}")
+        raise HTTPException(500, "Internal server error")
+    if result is None:
+        return JSONResponse({'message':'not_found'},status_code = 404)
+    return {
+        "count": len(result),
+        "result": result,
+        "next_cursor": result[-1].created_at if len(result) == limit else None,
+    }
+
+
 @router.get("/get-all-products-paginated")
 async def get_all_products_paginated(
     page: int,
@@ -218,3 +303,15 @@ async def get_all_products_paginated(
         logger.error(f"Error get all products paginated: {str(e)}")
         raise HTTPException(500, "Internal server error")
 
+
+@router.get("/client-metrics")
+async def get_client_metrics(
+    format: str = "json",
+    user_id: str = Depends(oauth2_scheme),
+):
+    """
+    метрики запросов к API Wildberries (format=prometheus для текстового формата)
+    """
+    if format == "prometheus":
+        return PlainTextResponse(wb_client.metrics.render_prometheus())
+    return wb_client.metrics.snapshot()
@@ -0,0 +1,195 @@
+"""
+Управление планировщиком через Redis: пауза циклов, срочное обновление
+товаров вне очереди и состояние процессов планировщика.
+
+Состояние хранится в Redis, поэтому эндпоинты API управляют планировщиком
+и тогда, когда он работает в отдельном сервисе scheduler.ingest.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from dataclasses import asdict
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from redis_client import RedisClient
+from routers.third_party_integrations.service.wb.service.product_index import (
+    product_index,
+)
+
+load_dotenv()
+
+# Период проверки срочной очереди и флага паузы в секундах
+SCHEDULER_CONTROL_POLL_INTERVAL = float(
+    os.getenv("SCHEDULER_CONTROL_POLL_INTERVAL", 0.5)
+)
+# Период публикации состояния процесса в секундах
+SCHEDULER_STATUS_INTERVAL = float(os.getenv("SCHEDULER_STATUS_INTERVAL", 5))
+SCHEDULER_URGENT_BATCH_SIZE = int(os.getenv("SCHEDULER_URGENT_BATCH_SIZE", 100))
+
+
+class SchedulerControl:
+    """
+    Пауза и срочная очередь планировщика.
+
+    Обычный конвейер перед каждым пакетом запросов вызывает wait_turn:
+    пока идет срочное обновление или циклы поставлены на паузу, новые
+    пакеты не отправляются. Срочные товары обновляются тем же конвейером,
+    поэтому проходят через общий ограничитель частоты запросов
+    и пакетную запись истории.
+
+    Args:
+        redis: Клиент Redis
+        worker_id: Идентификатор процесса
+        urgent_batch_size: Максимальное число срочных товаров в одном пакете
+    """
+
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = None,
+        worker_id: Optional[str] = None,
+        urgent_batch_size: int = SCHEDULER_URGENT_BATCH_SIZE,
+    ):
+        self.redis = redis or RedisClient()
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+        self.urgent_batch_size = urgent_batch_size
+        self.paused = False
+        self.urgent_in_flight = 0
+        # Текущий конвейер обычного цикла и планировщик запусков
+        self.pipeline = None
+        self.ticker = None
+        self._urgent_idle = asyncio.Event()
+        self._urgent_idle.set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def pause(self):
+        await self.redis.set_scheduler_paused(True)
+
+    async def resume(self):
+        await self.redis.set_scheduler_paused(False)
+
+    async def enqueue(self, artikuls: List[str]) -> int:
+        """
+        Ставит артикулы в срочную очередь.
+
+        Returns:
+            int: Длина очереди
+        """
+        return await self.redis.push_urgent_artikuls(artikuls)
+
+    async def get_state(self) -> dict:
+        """
+        Состояние планировщика по данным всех процессов.
+        """
+        return {
+            "paused": await self.redis.is_scheduler_paused(),
+            "urgent_queue_depth": await self.redis.count_urgent_artikuls(),
+            "workers": [
+                json.loads(status)
+                for status in await self.redis.get_scheduler_statuses()
+            ],
+        }
+
+    async def wait_turn(self):
+        """
+        Ожидает, пока нет срочных обновлений и планировщик не на паузе.
+        """
+        while True:
+            await self._urgent_idle.wait()
+            if not self.paused:
+                return
+            await asyncio.sleep(SCHEDULER_CONTROL_POLL_INTERVAL)
+
+    def status(self) -> dict:
+        """
+        Состояние текущего процесса.
+        """
+        status = {
+            "worker_id": self.worker_id,
+            "paused": self.paused,
+            "urgent_in_flight": self.urgent_in_flight,
+            "cycle": None,
+            "ticker": asdict(self.ticker.stats) if self.ticker else None,
+            "product_index": product_index.snapshot(),
+            "updated_at": time.time(),
+        }
+        if self.pipeline is not None:
+            stats = self.pipeline.stats
+            status["cycle"] = {
+                "total": stats.total,
+                "processed": stats.processed,
+                "failed": stats.failed,
+                "in_flight": stats.total - stats.done,
+                "queues": self.pipeline.queue_depths(),
+            }
+        return status
+
+    async def _poll_urgent(self, refresh: Callable[[List[str]], Awaitable[None]]):
+        while True:
+            try:
+                self.paused = await self.redis.is_scheduler_paused()
+                artikuls = await self.redis.pop_urgent_artikuls(
+                    self.urgent_batch_size
+                )
+            except Exception as e:
+                logger.error(f"Ошибка чтения срочной очереди: {str(e)}")
+                artikuls = []
+            if not artikuls:
+                await asyncio.sleep(SCHEDULER_CONTROL_POLL_INTERVAL)
+                continue
+
+            self._urgent_idle.clear()
+            self.urgent_in_flight = len(artikuls)
+            try:
+                await refresh(artikuls)
+            except Exception as e:
+                logger.exception(f"Ошибка срочного обновления: {str(e)}")
+            finally:
+                self.urgent_in_flight = 0
+                self._urgent_idle.set()
+
+    async def _publish_status(self):
+        ttl = int(SCHEDULER_STATUS_INTERVAL * 3) + 1
+        while True:
+            try:
+                await self.redis.save_scheduler_status(
+                    self.worker_id, json.dumps(self.status()), ttl
+                )
+            except Exception as e:
+                logger.error(f"Ошибка публикации состояния планировщика: {str(e)}")
+            await asyncio.sleep(SCHEDULER_STATUS_INTERVAL)
+
+    def start(self, refresh: Callable[[List[str]], Awaitable[None]]):
+        """
+        Запускает срочную очередь и публикацию состояния.
+
+        Args:
+            refresh: Обновление товаров по списку артикулов
+        """
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._poll_urgent(refresh)),
+                asyncio.create_task(self._publish_status()),
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._urgent_idle.set()
+
+
+scheduler_control = SchedulerControl()
@@ -0,0 +1,128 @@
+"""
+Отдельный сервис обновления товаров из нескольких процессов.
+
+Каждый процесс обрабатывает свой раздел артикулов
+((hashtext(artikul) & 2147483647) % число процессов) в собственном
+цикле событий, со своей HTTP-сессией и пулом соединений с базой данных.
+Разбор ответов и валидация данных распределяются по ядрам и не занимают
+цикл событий API. При запуске сервиса в API нужно отключить встроенный
+планировщик (SCHEDULER_IN_API=0).
+
+Ограничитель частоты запросов к API у каждого процесса свой, поэтому
+сервис использует долю INGEST_RATE_SHARE бюджета WB_RATE_LIMIT
+и делит ее поровну между процессами (WB_RATE_LIMIT_SHARE процесса).
+Остаток бюджета остается процессу API.
+
+Запуск из каталога src:
+    python -m scheduler.ingest [--workers 4]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+# Пауза перед перезапуском завершившегося процесса в секундах
+INGEST_RESTART_DELAY = float(os.getenv("INGEST_RESTART_DELAY", 5))
+# Доля бюджета запросов к API Wildberries, которую использует сервис
+INGEST_RATE_SHARE = float(os.getenv("INGEST_RATE_SHARE", 1))
+
+
+def run_worker(index: int, count: int):
+    """
+    Точка входа процесса загрузки. Модули приложения импортируются
+    в самом процессе, чтобы клиенты и пулы создавались заново.
+    """
+    from scheduler.main import run_scheduler
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    logger.info(f"Процесс загрузки {index + 1}/{count} запущен (pid {os.getpid()})")
+    try:
+        asyncio.run(run_scheduler(partition=(index, count)))
+    except KeyboardInterrupt:
+        logger.info(f"Процесс загрузки {index + 1}/{count} остановлен")
+
+
+def init_schema():
+    from database.main import engine, init_models
+
+    async def init():
+        await init_models()
+        await engine.dispose()
+
+    asyncio.run(init())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+    count = max(args.workers, 1)
+
+    # Разделы процессов статичны, поэтому аренды шардов между ними не нужны
+    os.environ["SCHEDULER_COORDINATION"] = "0"
+    # Доля процесса API задается тем же WB_RATE_LIMIT_SHARE в окружении
+    api_share = float(os.getenv("WB_RATE_LIMIT_SHARE", 1))
+    if round(api_share + INGEST_RATE_SHARE, 6) > 1:
+        logger.warning(
+            f"WB_RATE_LIMIT_SHARE ({api_share}) и INGEST_RATE_SHARE "
+            f"({INGEST_RATE_SHARE}) в сумме больше 1: API и сервис загрузки "
+            f"вместе превысят WB_RATE_LIMIT"
+        )
+    # Процессы наследуют окружение и делят бюджет запросов поровну
+    os.environ["WB_RATE_LIMIT_SHARE"] = str(INGEST_RATE_SHARE / count)
+    logger.info(
+        f"Доля бюджета запросов к API на процесс: {INGEST_RATE_SHARE / count:.3f}"
+    )
+    init_schema()
+
+    context = multiprocessing.get_context("spawn")
+    workers = {}
+    stopping = False
+
+    def start(index: int):
+        process = context.Process(
+            target=run_worker, args=(index, count), name=f"ingest-{index}"
+        )
+        process.start()
+        workers[index] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(count):
+        start(index)
+    logger.info(f"Запущено процессов загрузки: {count}")
+
+    while not stopping:
+        time.sleep(1)
+        for index, process in list(workers.items()):
+            if not process.is_alive() and not stopping:
+                logger.error(
+                    f"Процесс загрузки {index + 1}/{count} завершился "
+                    f"с кодом {process.exitcode}, перезапуск"
+                )
+                time.sleep(INGEST_RESTART_DELAY)
+                start(index)
+
+    for process in workers.values():
+        process.terminate()
+    for process in workers.values():
+        process.join()
+    logger.info("Процессы загрузки остановлены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Распределение обновления товаров между процессами через аренды в Redis.
+
+Каталог разбит на SCHEDULER_SHARD_COUNT шардов (product_id % число шардов).
+Каждый шард захватывается арендой с TTL, которую владелец продлевает
+в фоне. Если процесс завершился, аренда истекает и шард забирает другой
+процесс в следующем цикле. Процесс берет не больше своей доли шардов,
+поэтому добавление реплик распределяет работу, а не дублирует ее.
+"""
+
+import asyncio
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from typing import List, Optional, Set
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from redis_client import RedisClient
+
+load_dotenv()
+
+SCHEDULER_COORDINATION = os.getenv("SCHEDULER_COORDINATION", "1") == "1"
+SCHEDULER_SHARD_COUNT = int(os.getenv("SCHEDULER_SHARD_COUNT", 16))
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", 60))
+SCHEDULER_HEARTBEAT_INTERVAL = float(os.getenv("SCHEDULER_HEARTBEAT_INTERVAL", 15))
+
+WORKER_GROUP = "scheduler"
+
+
+class ShardCoordinator:
+    """
+    Захват и продление аренд шардов текущим процессом.
+
+    Args:
+        redis: Клиент Redis
+        worker_id: Идентификатор процесса
+        shard_count: Число шардов
+        lease_ttl: Время жизни аренды в секундах
+        heartbeat_interval: Период продления аренд в секундах
+    """
+
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = None,
+        worker_id: Optional[str] = None,
+        shard_count: int = SCHEDULER_SHARD_COUNT,
+        lease_ttl: float = SCHEDULER_LEASE_TTL,
+        heartbeat_interval: float = SCHEDULER_HEARTBEAT_INTERVAL,
+    ):
+        self.redis = redis or RedisClient()
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.shards: Set[int] = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @property
+    def _ttl_ms(self) -> int:
+        return int(self.lease_ttl * 1000)
+
+    async def _register(self):
+        expires_at = int(time.time() * 1000) + self._ttl_ms
+        await self.redis.register_worker(WORKER_GROUP, self.worker_id, expires_at)
+
+    async def fair_share(self) -> int:
+        """
+        Число шардов, приходящееся на один живой процесс.
+        """
+        workers = await self.redis.count_workers(
+            WORKER_GROUP, int(time.time() * 1000)
+        )
+        return math.ceil(self.shard_count / max(workers, 1))
+
+    async def claim(self) -> List[int]:
+        """
+        Захватывает свободные шарды до своей доли и отпускает лишние.
+
+        Returns:
+            List[int]: Шарды, принадлежащие процессу
+        """
+        await self._register()
+        share = await self.fair_share()
+
+        for shard in sorted(self.shards)[share:]:
+            await self.redis.release_lease(f"shard-{shard}", self.worker_id)
+            self.shards.discard(shard)
+
+        # Разные процессы начинают перебор с разных шардов,
+        # чтобы не соревноваться за одни и те же аренды
+        offset = zlib.crc32(self.worker_id.encode()) % self.shard_count
+        for i in range(self.shard_count):
+            if len(self.shards) >= share:
+                break
+            shard = (offset + i) % self.shard_count
+            if shard in self.shards:
+                continue
+            if await self.redis.acquire_lease(
+                f"shard-{shard}", self.worker_id, self._ttl_ms
+            ):
+                self.shards.add(shard)
+
+        logger.info(
+            f"Процесс {self.worker_id} владеет шардами {sorted(self.shards)} "
+            f"(доля {share} из {self.shard_count})"
+        )
+        return sorted(self.shards)
+
+    async def renew(self):
+        """
+        Продлевает аренды и регистрацию процесса. Потерянные аренды
+        исключаются из списка шардов процесса.
+        """
+        await self._register()
+        for shard in list(self.shards):
+            if not await self.redis.renew_lease(
+                f"shard-{shard}", self.worker_id, self._ttl_ms
+            ):
+                logger.warning(f"Аренда шарда {shard} потеряна")
+                self.shards.discard(shard)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.renew()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд шардов: {str(e)}")
+
+    def start(self):
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        """
+        Останавливает продление и освобождает аренды, чтобы другие
+        процессы могли забрать шарды, не дожидаясь истечения TTL.
+        """
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        try:
+            for shard in list(self.shards):
+                await self.redis.release_lease(f"shard-{shard}", self.worker_id)
+            await self.redis.unregister_worker(WORKER_GROUP, self.worker_id)
+        except Exception as e:
+            logger.error(f"Ошибка освобождения аренд шардов: {str(e)}")
+        self.shards.clear()
+
+
+shard_coordinator = ShardCoordinator()
@@ -4,69 +4,56 @@
 """
 
 import asyncio
+from functools import partial
 from loguru import logger
-from datetime import datetime, timedelta
-from scheduler.tasks import add_product_in_db
+from scheduler.tasks import add_product_in_db, refresh_products
+from scheduler.control import scheduler_control
+from scheduler.ticker import PeriodicScheduler
+from scheduler.leases import SCHEDULER_COORDINATION, shard_coordinator
+from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
+    wb_client,
+)
 import os
 from dotenv import load_dotenv
 
 INTERVAL_IN_MINUTES = int(os.getenv("INTERVAL_IN_MINUTES"))
 
+ticker = PeriodicScheduler(add_product_in_db, INTERVAL_IN_MINUTES * 60)
 
-async def update_timer(minutes: int):
+
+async def main_scheduler(partition: tuple[int, int] | None = None):
     """
-    Обновляет таймер и выводит оставшееся время.
+    Основная функция планировщика.
+    Запускает периодический сбор данных.
 
     Args:
-        minutes: Количество минут до следующего запуска
+        partition: Номер раздела и число разделов артикулов,
+            которые обрабатывает процесс
     """
-    remaining_seconds = minutes * 60
-    while remaining_seconds > 0:
-        if remaining_seconds > 0:
-            minutes = remaining_seconds // 60
-            seconds = remaining_seconds % 60
-            logger.debug(
-                f"До следующего сбора данных осталось: {minutes} мин {seconds} сек"
-            )
-
-        await asyncio.sleep(min(10, remaining_seconds))
-        remaining_seconds -= 10
-
-        if remaining_seconds <= 0:
-            logger.debug("Начинаем новый сбор данных...")
-
-
-async def main_scheduler():
+    if partition is not None:
+        ticker.job = partial(add_product_in_db, partition)
+    if SCHEDULER_COORDINATION:
+        shard_coordinator.start()
+    scheduler_control.ticker = ticker
+    scheduler_control.start(refresh_products)
+    try:
+        await ticker.run()
+    finally:
+        await scheduler_control.stop()
+        if SCHEDULER_COORDINATION:
+            await shard_coordinator.stop()
+
+
+async def run_scheduler(partition: tuple[int, int] | None = None):
     """
-    Основная функция планировщика.
-    Запускает периодический сбор данных.
+    Запускает планировщик отдельно от API вместе с HTTP-сессией клиента.
     """
-    while True:
-        try:
-            # Рассчитываем время следующего запуска
-            next_run = datetime.now() + timedelta(minutes=INTERVAL_IN_MINUTES)
-            logger.info(
-                f"Следующий сбор данных в {next_run.strftime('%H:%M:%S')} "
-                f"(через {INTERVAL_IN_MINUTES} минут)"
-            )
-
-            # Проверяем, нужно ли ждать таймер (если текущее время не кратно интервалу)
-            current_minute = datetime.now().minute
-            if current_minute % INTERVAL_IN_MINUTES != 0:
-                # При первом запуске сначала ждем таймер
-                await update_timer(INTERVAL_IN_MINUTES)
-                await add_product_in_db()
-            else:
-                # При последующих запусках работаем параллельно
-                timer_task = asyncio.create_task(update_timer(INTERVAL_IN_MINUTES))
-                data_task = asyncio.create_task(add_product_in_db())
-                await asyncio.gather(timer_task, data_task)
-
-        except Exception as e:
-            logger.error(f"Ошибка в планировщике: {str(e)}")
-            # Ждем 5 минут перед повторной попыткой
-            await asyncio.sleep(300)
+    await wb_client.start()
+    try:
+        await main_scheduler(partition)
+    finally:
+        await wb_client.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main_scheduler())
+    asyncio.run(run_scheduler())
@@ -0,0 +1,371 @@
+"""
+Конвейер обновления данных о товарах.
+
+Этапы получения данных из API, преобразования и сохранения работают
+одновременно и связаны ограниченными очередями, поэтому медленный товар
+занимает только одного исполнителя своего этапа, а не весь пакет.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import (
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from dotenv import load_dotenv
+from loguru import logger
+from pydantic import ValidationError
+
+from database.main import async_session
+from routers.third_party_integrations.service.wb.service.circuit_breaker import (
+    CircuitBreakerOpenError,
+)
+from routers.third_party_integrations.service.wb.service.product_repo import (
+    ProductRepository,
+)
+from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
+    WildberriesAPIClient,
+    wb_client,
+)
+from scheduler.control import SchedulerControl
+from scheduler.polling import ADAPTIVE_POLLING
+from scheduler.refresh_runs import RunCheckpoint
+from schemas.product import ProductHistoryShema
+
+load_dotenv()
+
+SCHEDULER_FETCH_WORKERS = int(os.getenv("SCHEDULER_FETCH_WORKERS", 4))
+SCHEDULER_TRANSFORM_WORKERS = int(os.getenv("SCHEDULER_TRANSFORM_WORKERS", 2))
+SCHEDULER_PERSIST_WORKERS = int(os.getenv("SCHEDULER_PERSIST_WORKERS", 2))
+SCHEDULER_QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", 1000))
+# Запись истории сбрасывается в базу при накоплении SCHEDULER_FLUSH_SIZE
+# строк или через SCHEDULER_FLUSH_INTERVAL секунд после первой строки
+SCHEDULER_FLUSH_SIZE = int(os.getenv("SCHEDULER_FLUSH_SIZE", 500))
+SCHEDULER_FLUSH_INTERVAL = float(os.getenv("SCHEDULER_FLUSH_INTERVAL", 2))
+
+# Сигнал завершения работы для исполнителей этапа
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    total: int = 0
+    processed: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def done(self) -> int:
+        return self.processed + self.failed
+
+    @property
+    def duration(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+class RefreshPipeline:
+    """
+    Конвейер fetch -> transform -> persist с настраиваемым числом
+    исполнителей на каждом этапе.
+
+    Args:
+        client: Клиент API Wildberries
+        repository: Репозиторий товаров
+        fetch_workers: Число одновременных пакетных запросов к API
+        transform_workers: Число исполнителей валидации данных
+        persist_workers: Число одновременных записей в базу данных
+        queue_size: Размер очередей между этапами
+        flush_size: Число строк истории в одной записи
+        flush_interval: Максимальное время накопления строк в секундах
+        adaptive_polling: Пересчитывать расписание опроса товаров
+        checkpoint: Прогресс запуска, в котором отмечаются обработанные товары
+        control: Управление планировщиком; пакеты запросов ждут окончания
+            срочных обновлений и снятия паузы
+    """
+
+    def __init__(
+        self,
+        client: WildberriesAPIClient = wb_client,
+        repository: Optional[ProductRepository] = None,
+        fetch_workers: int = SCHEDULER_FETCH_WORKERS,
+        transform_workers: int = SCHEDULER_TRANSFORM_WORKERS,
+        persist_workers: int = SCHEDULER_PERSIST_WORKERS,
+        queue_size: int = SCHEDULER_QUEUE_SIZE,
+        flush_size: int = SCHEDULER_FLUSH_SIZE,
+        flush_interval: float = SCHEDULER_FLUSH_INTERVAL,
+        adaptive_polling: bool = ADAPTIVE_POLLING,
+        checkpoint: Optional[RunCheckpoint] = None,
+        control: Optional[SchedulerControl] = None,
+    ):
+        self.client = client
+        self.repository = repository or ProductRepository()
+        self.fetch_workers = fetch_workers
+        self.transform_workers = transform_workers
+        self.persist_workers = persist_workers
+        self.queue_size = queue_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.adaptive_polling = adaptive_polling
+        self.checkpoint = checkpoint
+        self.control = control
+        self.stats = PipelineStats()
+        self._queues: Dict[str, asyncio.Queue] = {}
+        # Товары, следующий опрос которых нужно отложить после неудачи
+        self._poll_failures: List[int] = []
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: queue.qsize() for name, queue in self._queues.items()}
+
+    def _fail(self, sub, reason: str):
+        logger.warning(f"Артикул {sub.artikul} не обновлен: {reason}")
+        if self.adaptive_polling:
+            self._poll_failures.append(sub.id)
+        self._count(sub, processed=False, reason=reason)
+
+    def _count(self, sub, processed: bool, reason: Optional[str] = None):
+        if self.checkpoint is not None:
+            self.checkpoint.mark(sub.id, sub.artikul, reason)
+        if processed:
+            self.stats.processed += 1
+        else:
+            self.stats.failed += 1
+        if self.stats.done % 100 == 0:
+            logger.info(
+                f"Прогресс: {self.stats.done}/{self.stats.total} "
+                f"(успешно: {self.stats.processed}, ошибок: {self.stats.failed})"
+            )
+
+    async def _fetch(self, chunk: List, outbox: asyncio.Queue):
+        if self.control is not None:
+            await self.control.wait_turn()
+        try:
+            products = await self.client.fetch_products_details(
+                sub.artikul for sub in chunk
+            )
+        except CircuitBreakerOpenError as e:
+            logger.warning(f"Пакет пропущен: {str(e)}")
+            products = {}
+        except Exception as e:
+            # Товары пакета отмечаются, иначе курсор запуска не сдвинется
+            logger.exception(f"Ошибка запроса пакета: {str(e)}")
+            for sub in chunk:
+                self._fail(sub, f"ошибка запроса: {str(e)}")
+            return
+        for sub in chunk:
+            product = products.get(sub.artikul)
+            if product:
+                await outbox.put((sub, product))
+            else:
+                self._fail(sub, "данные не получены")
+
+    async def _transform(self, item, outbox: asyncio.Queue):
+        sub, product = item
+        try:
+            history = ProductHistoryShema(**product)
+        except ValidationError as e:
+            self._fail(sub, f"некорректные данные: {str(e)}")
+            return
+        except Exception as e:
+            logger.exception(f"Ошибка преобразования {sub.artikul}: {str(e)}")
+            self._fail(sub, f"ошибка преобразования: {str(e)}")
+            return
+        await outbox.put((sub, history))
+
+    async def _flush(self, buffer: Dict[int, Tuple]):
+        """
+        Записывает накопленную историю одной транзакцией
+        и пересчитывает расписание опроса записанных товаров.
+        """
+        if not buffer:
+            return
+        snapshots = {product_id: history for product_id, (_, history) in buffer.items()}
+        try:
+            async with async_session() as session:
+                unchanged = None
+                if self.adaptive_polling:
+                    unchanged = await self.repository.get_unchanged_products(
+                        snapshots, session
+                    )
+                failures = await self.repository.add_products_history_bulk(
+                    snapshots, session, unchanged=unchanged
+                )
+                if self.adaptive_polling:
+                    await self.repository.update_poll_schedule(
+                        {
+                            product_id: product_id not in unchanged
+                            for product_id in snapshots
+                            if product_id not in failures
+                        },
+                        session,
+                    )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи пакета истории: {str(e)}")
+            failures = {product_id: str(e) for product_id in buffer}
+
+        for product_id, (sub, _) in buffer.items():
+            if product_id in failures:
+                self._fail(sub, f"ошибка записи: {failures[product_id]}")
+            else:
+                self._count(sub, processed=True)
+
+    async def _save_poll_failures(self):
+        """
+        Откладывает следующий опрос товаров, которые не удалось обновить.
+        """
+        while self._poll_failures:
+            product_ids = self._poll_failures[: self.flush_size]
+            del self._poll_failures[: self.flush_size]
+            try:
+                async with async_session() as session:
+                    await self.repository.update_poll_schedule(
+                        {}, session, failed=product_ids
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Ошибка записи расписания опроса: {str(e)}")
+
+    async def _run_persist_stage(self, workers: int, inbox: asyncio.Queue):
+        async def worker():
+            buffer: Dict[int, Tuple] = {}
+            deadline = None
+            while True:
+                timeout = None
+                if buffer:
+                    timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    item = await asyncio.wait_for(inbox.get(), timeout)
+                except asyncio.TimeoutError:
+                    await self._flush(buffer)
+                    buffer = {}
+                    continue
+
+                if item is _DONE:
+                    await self._flush(buffer)
+                    return
+
+                sub, history = item
+                if sub.id in buffer:
+                    await self._flush(buffer)
+                    buffer = {}
+                if not buffer:
+                    deadline = time.monotonic() + self.flush_interval
+                buffer[sub.id] = item
+                if len(buffer) >= self.flush_size:
+                    await self._flush(buffer)
+                    buffer = {}
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        # Все ошибки этапов к этому моменту уже отмечены
+        await self._save_poll_failures()
+
+    async def _run_stage(
+        self,
+        workers: int,
+        inbox: asyncio.Queue,
+        handler: Callable[..., Awaitable[None]],
+        outbox: Optional[asyncio.Queue],
+        next_workers: int,
+    ):
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    await handler(item, outbox)
+                except Exception as e:
+                    logger.exception(f"Ошибка этапа {handler.__name__}: {str(e)}")
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(next_workers):
+                await outbox.put(_DONE)
+
+    async def _finish_feed(self, fetch_queue: asyncio.Queue):
+        for _ in range(self.fetch_workers):
+            await fetch_queue.put(_DONE)
+
+    async def run(self, subs: Union[Iterable, AsyncIterable]) -> PipelineStats:
+        """
+        Обновляет данные о товарах.
+
+        Args:
+            subs: Товары из базы данных (нужны поля id и artikul), список
+                или асинхронный генератор. Генератор читается по мере
+                освобождения очереди, поэтому запросы к API начинаются
+                до окончания чтения каталога
+
+        Returns:
+            PipelineStats: Статистика обработки
+        """
+        self.stats = PipelineStats()
+        self._poll_failures = []
+        fetch_queue = asyncio.Queue(maxsize=self.fetch_workers * 2)
+        transform_queue = asyncio.Queue(maxsize=self.queue_size)
+        persist_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues = {
+            "fetch": fetch_queue,
+            "transform": transform_queue,
+            "persist": persist_queue,
+        }
+
+        async def items():
+            if isinstance(subs, AsyncIterable):
+                async for sub in subs:
+                    yield sub
+            else:
+                for sub in subs:
+                    yield sub
+
+        async def feed():
+            batch_size = self.client.batch_size
+            chunk = []
+            try:
+                async for sub in items():
+                    chunk.append(sub)
+                    self.stats.total += 1
+                    if len(chunk) >= batch_size:
+                        await fetch_queue.put(chunk)
+                        chunk = []
+                if chunk:
+                    await fetch_queue.put(chunk)
+            except asyncio.CancelledError:
+                # Исполнители этапов отменяются вместе с run: сигналы
+                # завершения никто не прочитает, а put в полную очередь
+                # заблокировал бы задачу навсегда
+                raise
+            except Exception:
+                await self._finish_feed(fetch_queue)
+                raise
+            await self._finish_feed(fetch_queue)
+
+        await asyncio.gather(
+            feed(),
+            self._run_stage(
+                self.fetch_workers,
+                fetch_queue,
+                self._fetch,
+                transform_queue,
+                self.transform_workers,
+            ),
+            self._run_stage(
+                self.transform_workers,
+                transform_queue,
+                self._transform,
+                persist_queue,
+                self.persist_workers,
+            ),
+            self._run_persist_stage(self.persist_workers, persist_queue),
+        )
+        return self.stats
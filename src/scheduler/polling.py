@@ -0,0 +1,77 @@
+"""
+Адаптивная частота опроса товаров.
+
+Товар, данные которого давно не менялись, опрашивается все реже, товар
+с подписчиками - чаще. Интервал всегда лежит в пределах
+[POLL_MIN_INTERVAL_MINUTES, POLL_MAX_INTERVAL_MINUTES].
+"""
+
+import math
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "1") == "1"
+POLL_MIN_INTERVAL_MINUTES = int(
+    os.getenv("POLL_MIN_INTERVAL_MINUTES", os.getenv("INTERVAL_IN_MINUTES", 5))
+)
+POLL_MAX_INTERVAL_MINUTES = int(os.getenv("POLL_MAX_INTERVAL_MINUTES", 1440))
+# Товар считается готовым к опросу, если его время наступает в пределах
+# этого допуска (в секундах). next_poll_at отсчитывается от записи данных,
+# которая происходит позже начала цикла, поэтому без допуска товар
+# с минимальным интервалом опрашивался бы только через цикл
+POLL_DUE_TOLERANCE_SECONDS = float(
+    os.getenv(
+        "POLL_DUE_TOLERANCE_SECONDS", int(os.getenv("INTERVAL_IN_MINUTES", 5)) * 60 / 2
+    )
+)
+# Во сколько раз растет интервал после каждого опроса без изменений
+POLL_BACKOFF_FACTOR = float(os.getenv("POLL_BACKOFF_FACTOR", 2))
+# Максимальное число товаров за один цикл (0 - без ограничения)
+POLL_MAX_PRODUCTS_PER_CYCLE = int(os.getenv("POLL_MAX_PRODUCTS_PER_CYCLE", 0))
+
+# Какие товары обновляет планировщик:
+# all - все, subscribed - только товары с подписчиками,
+# prioritized - все, но товары без подписчиков не чаще ORPHAN_POLL_INTERVAL_MINUTES
+REFRESH_SCOPE = os.getenv("REFRESH_SCOPE", "all")
+ORPHAN_POLL_INTERVAL_MINUTES = int(os.getenv("ORPHAN_POLL_INTERVAL_MINUTES", 1440))
+
+
+def compute_next_interval(
+    unchanged_streak: int,
+    subscribers: int,
+    min_interval: float = POLL_MIN_INTERVAL_MINUTES * 60,
+    max_interval: float = POLL_MAX_INTERVAL_MINUTES * 60,
+    backoff: float = POLL_BACKOFF_FACTOR,
+    orphan_interval: float | None = (
+        ORPHAN_POLL_INTERVAL_MINUTES * 60 if REFRESH_SCOPE == "prioritized" else None
+    ),
+) -> int:
+    """
+    Вычисляет интервал до следующего опроса товара.
+
+    Args:
+        unchanged_streak: Число опросов подряд без изменения данных
+        subscribers: Число подписчиков товара
+        min_interval: Минимальный интервал в секундах
+        max_interval: Максимальный интервал в секундах
+        backoff: Множитель интервала за каждый опрос без изменений
+        orphan_interval: Минимальный интервал товара без подписчиков
+
+    Returns:
+        int: Интервал в секундах
+    """
+    # Ограничение степени, чтобы не получить переполнение на длинных сериях
+    exponent = min(unchanged_streak, 64)
+    try:
+        interval = min_interval * backoff**exponent
+    except OverflowError:
+        interval = max_interval
+    # Каждое удвоение числа подписчиков сокращает интервал
+    interval /= 1 + math.log2(1 + max(subscribers, 0))
+    interval = min(max(interval, min_interval), max_interval)
+    if orphan_interval and subscribers <= 0:
+        interval = max(interval, orphan_interval)
+    return int(interval)
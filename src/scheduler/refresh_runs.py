@@ -0,0 +1,216 @@
+"""
+Сохранение прогресса запусков обновления товаров.
+
+Запуск хранится в таблице refresh_runs. Курсор - наибольший id товара,
+до которого включительно обработаны все товары запуска, поэтому после
+перезапуска процесса незавершенный запуск продолжается с товаров,
+id которых больше курсора.
+
+Продолжается только запуск с той же областью обновления, прогресс
+которого сохранялся не раньше REFRESH_RUN_STALE_MINUTES назад. Более
+старые незавершенные запуски (область сменилась при перераспределении
+шардов или числа процессов) помечаются abandoned. При создании нового
+запуска удаляются завершенные запуски старше REFRESH_RUN_RETENTION_DAYS.
+"""
+
+import bisect
+import os
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy import cast, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import RefreshRunModel
+
+load_dotenv()
+
+# Период сохранения курсора в секундах
+REFRESH_CHECKPOINT_INTERVAL = float(os.getenv("REFRESH_CHECKPOINT_INTERVAL", 10))
+# Максимальное число ошибок, сохраняемых в записи запуска
+REFRESH_RUN_MAX_FAILURES = int(os.getenv("REFRESH_RUN_MAX_FAILURES", 1000))
+# Через сколько минут без сохранения прогресса незавершенный запуск
+# не продолжается, а считается брошенным
+REFRESH_RUN_STALE_MINUTES = float(
+    os.getenv(
+        "REFRESH_RUN_STALE_MINUTES", int(os.getenv("INTERVAL_IN_MINUTES", 5)) * 3
+    )
+)
+# Сколько дней хранятся завершенные и брошенные запуски (0 - без удаления)
+REFRESH_RUN_RETENTION_DAYS = float(os.getenv("REFRESH_RUN_RETENTION_DAYS", 30))
+
+
+class RunCheckpoint:
+    """
+    Прогресс запуска: курсор по обработанным товарам, счетчики и ошибки.
+
+    Args:
+        run: Запись запуска
+        product_ids: id товаров, которые обрабатывает запуск. При потоковом
+            чтении каталога товары добавляются через track
+        max_failures: Максимальное число сохраняемых ошибок
+    """
+
+    def __init__(
+        self,
+        run: RefreshRunModel,
+        product_ids: Iterable[int] = (),
+        max_failures: int = REFRESH_RUN_MAX_FAILURES,
+    ):
+        self.run_id = run.id
+        self.cursor = run.cursor or 0
+        self.processed = run.processed or 0
+        self.failed = run.failed or 0
+        self.failures: Dict[str, str] = dict(run.failures or {})
+        self.max_failures = max_failures
+        self.started_at = time.monotonic()
+        # Длительность предыдущих попыток прерванного запуска
+        self._previous_duration = run.duration_seconds or 0.0
+
+        self._ids = sorted(product_ids)
+        self._position = bisect.bisect_right(self._ids, self.cursor)
+        self._done = set()
+        # Товары, обработанные до перезапуска, и товары текущей попытки
+        self.total = self.processed + self.failed + len(self._ids) - self._position
+
+    def track(self, product_id: int):
+        """
+        Добавляет товар в запуск. id должны поступать по возрастанию.
+        """
+        self._ids.append(product_id)
+        self.total += 1
+
+    @property
+    def duration(self) -> float:
+        return self._previous_duration + time.monotonic() - self.started_at
+
+    def mark(self, product_id: int, artikul: str, reason: Optional[str] = None):
+        """
+        Отмечает товар обработанным и сдвигает курсор.
+        """
+        if reason is None:
+            self.processed += 1
+        else:
+            self.failed += 1
+            if len(self.failures) < self.max_failures:
+                self.failures[artikul] = reason
+        self._done.add(product_id)
+        while self._position < len(self._ids) and self._ids[self._position] in self._done:
+            self._done.discard(self._ids[self._position])
+            self.cursor = self._ids[self._position]
+            self._position += 1
+
+
+class RefreshRunRepository:
+    async def start_run(
+        self,
+        scope: dict,
+        session: AsyncSession,
+        stale_minutes: float = REFRESH_RUN_STALE_MINUTES,
+        retention_days: float = REFRESH_RUN_RETENTION_DAYS,
+    ) -> RefreshRunModel:
+        """
+        Возвращает незавершенный запуск с той же областью обновления
+        или создает новый. Незавершенные запуски, прогресс которых
+        не сохранялся дольше stale_minutes, помечаются abandoned.
+
+        Args:
+            scope: Маркетплейс и шарды запуска
+            stale_minutes: Время без сохранения прогресса в минутах,
+                после которого запуск не продолжается
+            retention_days: Через сколько дней после окончания запуск
+                удаляется при создании нового (0 - не удалять)
+        """
+        try:
+            await session.execute(
+                update(RefreshRunModel)
+                .where(
+                    RefreshRunModel.status == "running",
+                    RefreshRunModel.updated_at
+                    < func.now() - timedelta(minutes=stale_minutes),
+                )
+                .values(status="abandoned", finished_at=func.now())
+            )
+            result = await session.execute(
+                select(RefreshRunModel)
+                .where(
+                    RefreshRunModel.status == "running",
+                    cast(RefreshRunModel.scope, JSONB) == literal(scope, JSONB),
+                )
+                .order_by(RefreshRunModel.id.desc())
+                .limit(1)
+            )
+            run = result.scalars().first()
+            if run is not None:
+                await session.commit()
+                logger.info(
+                    f"Продолжаем запуск обновления {run.id} с курсора {run.cursor}"
+                )
+                return run
+
+            if retention_days:
+                await session.execute(
+                    delete(RefreshRunModel).where(
+                        RefreshRunModel.status != "running",
+                        RefreshRunModel.finished_at
+                        < func.now() - timedelta(days=retention_days),
+                    )
+                )
+            run = RefreshRunModel(scope=scope, failures={})
+            session.add(run)
+            await session.commit()
+            await session.refresh(run)
+            return run
+        except Exception as e:
+            logger.error(f"Error start refresh run: {e}")
+            raise e
+
+    async def save_checkpoint(
+        self,
+        checkpoint: RunCheckpoint,
+        session: AsyncSession,
+        status: str = "running",
+    ):
+        """
+        Сохраняет курсор и счетчики запуска. Для завершенного запуска
+        также записываются длительность и время окончания.
+        """
+        values = {
+            "status": status,
+            "cursor": checkpoint.cursor,
+            "total": checkpoint.total,
+            "processed": checkpoint.processed,
+            "failed": checkpoint.failed,
+            "failures": checkpoint.failures,
+            "duration_seconds": checkpoint.duration,
+        }
+        if status != "running":
+            values["finished_at"] = func.now()
+        try:
+            await session.execute(
+                update(RefreshRunModel)
+                .where(RefreshRunModel.id == checkpoint.run_id)
+                .values(**values)
+            )
+            await session.commit()
+        except Exception as e:
+            logger.error(f"Error save refresh run checkpoint: {e}")
+            raise e
+
+    async def get_last_runs(
+        self, session: AsyncSession, limit: int = 10
+    ) -> list[RefreshRunModel]:
+        try:
+            result = await session.execute(
+                select(RefreshRunModel)
+                .order_by(RefreshRunModel.id.desc())
+                .limit(limit)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error get last refresh runs: {e}")
+            raise e
@@ -1 +1,4 @@
-from scheduler.tasks.add_product import add_product_in_db
+from scheduler.tasks.add_product import (
+    add_product_in_db,
+    refresh_products,
+)
@@ -6,105 +6,211 @@
 from routers.third_party_integrations.service.wb.service.product_repo import (
     ProductRepository,
 )
-from schemas.product import ProductShema, ProductHistoryShema
 from database.main import async_session
 from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
-    WildberriesAPIClient,
+    wb_client,
+)
+from scheduler.pipeline import RefreshPipeline
+from scheduler.polling import (
+    ADAPTIVE_POLLING,
+    ORPHAN_POLL_INTERVAL_MINUTES,
+    POLL_MAX_PRODUCTS_PER_CYCLE,
+    REFRESH_SCOPE,
+)
+from scheduler.leases import SCHEDULER_COORDINATION, shard_coordinator
+from scheduler.control import scheduler_control
+from scheduler.refresh_runs import (
+    REFRESH_CHECKPOINT_INTERVAL,
+    RefreshRunRepository,
+    RunCheckpoint,
 )
 
-from loguru import logger
 import asyncio
-from typing import List
+import time
+
+from loguru import logger
 
 product_repository = ProductRepository()
+refresh_run_repository = RefreshRunRepository()
 
-wb_client = WildberriesAPIClient()
+# Время последнего обновления товаров без подписчиков
+# (REFRESH_SCOPE=prioritized без адаптивного опроса)
+orphans_refreshed_at: float | None = None
 
 
-async def process_product(sub) -> bool:
+def subscribed_only() -> bool:
     """
-    Обрабатывает один товар.
-
-    Args:
-        sub: Объект подписки
+    Ограничивать ли цикл товарами с подписчиками.
 
-    Returns:
-        bool: True если обработка успешна, False в противном случае
+    При адаптивном опросе редкий опрос товаров без подписчиков
+    обеспечивает их интервал в расписании, без него - пропуск таких
+    товаров в циклах между обновлениями раз в ORPHAN_POLL_INTERVAL_MINUTES.
     """
-    async with async_session() as session:
-        try:
-            product = await wb_client.fetch_product_details(sub.artikul)
-            if product:
-                product["marketplace"] = sub.marketplace
-                product = ProductHistoryShema(**product)
-                await product_repository.add_product_history(
-                    sub.artikul, product, session
-                )
-                await session.commit()
-                return True
-            else:
-                logger.warning(f"Не удалось получить данные для артикула {sub.artikul}")
-                return False
-        except Exception as e:
-            logger.error(f"Ошибка при обработке артикула {sub.artikul}: {str(e)}")
-            await session.rollback()
-            return False
+    if REFRESH_SCOPE == "subscribed":
+        return True
+    if REFRESH_SCOPE == "prioritized" and not ADAPTIVE_POLLING:
+        return (
+            orphans_refreshed_at is not None
+            and time.monotonic() - orphans_refreshed_at
+            < ORPHAN_POLL_INTERVAL_MINUTES * 60
+        )
+    return False
 
 
-async def process_batch(subs: List, batch_size: int = 5):
-    """
-    Обрабатывает пакет товаров параллельно.
+async def save_checkpoint(checkpoint: RunCheckpoint, status: str = "running"):
+    try:
+        async with async_session() as session:
+            await refresh_run_repository.save_checkpoint(checkpoint, session, status)
+    except Exception as e:
+        logger.error(f"Не удалось сохранить прогресс запуска: {str(e)}")
 
-    Args:
-        subs: Список товаров для обработки
-        batch_size: Размер пакета для параллельной обработки
+
+async def checkpoint_loop(checkpoint: RunCheckpoint):
+    while True:
+        await asyncio.sleep(REFRESH_CHECKPOINT_INTERVAL)
+        await save_checkpoint(checkpoint)
+
+
+async def stream_catalogue(checkpoint: RunCheckpoint, **filters):
     """
-    for i in range(0, len(subs), batch_size):
-        batch = subs[i : i + batch_size]
-        tasks = [process_product(sub) for sub in batch]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        yield results
+    Потоковое чтение каталога с регистрацией товаров в запуске.
+    """
+    async with async_session() as session:
+        async for row in product_repository.stream_products_from_marketplace(
+            "wildberries", session, **filters
+        ):
+            checkpoint.track(row.id)
+            yield row
 
 
-async def add_product_in_db():
+async def add_product_in_db(partition: tuple[int, int] | None = None):
     """
     Основная функция сбора данных о товарах.
     Обрабатывает ошибки и ведет статистику.
+    При SCHEDULER_COORDINATION обрабатываются только шарды,
+    арендованные текущим процессом.
+    Прогресс сохраняется в refresh_runs, и прерванный запуск
+    продолжается со своего курсора.
+
+    Args:
+        partition: Номер раздела и число разделов артикулов
+            для процесса из scheduler.ingest
     """
+    try:
+        if await scheduler_control.redis.is_scheduler_paused():
+            logger.info("Планировщик на паузе, цикл пропущен")
+            return
+    except Exception as e:
+        logger.error(f"Не удалось проверить паузу планировщика: {str(e)}")
+
+    shards = shard_count = None
+    if SCHEDULER_COORDINATION:
+        try:
+            shards = await shard_coordinator.claim()
+        except Exception as e:
+            # Без Redis обновление не останавливается, а идет по всем товарам
+            logger.error(f"Не удалось получить аренды шардов: {str(e)}")
+        else:
+            if not shards:
+                logger.info("Свободных шардов нет, цикл пропущен")
+                return
+            shard_count = shard_coordinator.shard_count
+
+    global orphans_refreshed_at
+    only_subscribed = subscribed_only()
+
+    scope = {
+        "marketplace": "wildberries",
+        "shards": shards,
+        "shard_count": shard_count,
+        "partition": list(partition) if partition else None,
+        "subscribed_only": only_subscribed,
+    }
     async with async_session() as session:
         try:
-            subs = await product_repository.get_all_products_from_marketplace(
-                "wildberries", session
-            )
-            total_count = len(subs)
-            processed_count = 0
-            failed_count = 0
-
-            logger.info(f"Начинаем обработку {total_count} товаров")
-
-            # Обрабатываем товары пакетами
-            async for results in process_batch(subs):
-                for result in results:
-                    if isinstance(result, Exception):
-                        logger.error(f"Ошибка при обработке товара: {str(result)}")
-                        failed_count += 1
-                    elif result:
-                        processed_count += 1
-                    else:
-                        failed_count += 1
-
-                    # Логируем прогресс каждые 10 товаров
-                    if (processed_count + failed_count) % 10 == 0:
-                        logger.info(
-                            f"Прогресс: {processed_count + failed_count}/{total_count} "
-                            f"(успешно: {processed_count}, ошибок: {failed_count})"
-                        )
-
-            logger.info(
-                f"Обработка завершена. Всего: {total_count}, "
-                f"Успешно: {processed_count}, Ошибок: {failed_count}"
-            )
-
+            run = await refresh_run_repository.start_run(scope, session)
+            if ADAPTIVE_POLLING:
+                subs = await product_repository.get_due_products(
+                    "wildberries",
+                    session,
+                    limit=POLL_MAX_PRODUCTS_PER_CYCLE,
+                    shards=shards,
+                    shard_count=shard_count,
+                    partition=partition,
+                    subscribed_only=only_subscribed,
+                )
         except Exception as e:
             logger.error(f"Критическая ошибка при сборе данных: {str(e)}")
             await session.rollback()
+            return
+
+    if ADAPTIVE_POLLING:
+        subs = [sub for sub in subs if sub.id > run.cursor]
+        checkpoint = RunCheckpoint(run, [sub.id for sub in subs])
+        logger.info(f"Запуск {run.id}: начинаем обработку {len(subs)} товаров")
+    else:
+        checkpoint = RunCheckpoint(run)
+        subs = stream_catalogue(
+            checkpoint,
+            after_id=run.cursor,
+            shards=shards,
+            shard_count=shard_count,
+            partition=partition,
+            subscribed_only=only_subscribed,
+        )
+        logger.info(f"Запуск {run.id}: начинаем обработку каталога с id > {run.cursor}")
+    checkpoint_task = asyncio.create_task(checkpoint_loop(checkpoint))
+    pipeline = RefreshPipeline(
+        client=wb_client,
+        repository=product_repository,
+        checkpoint=checkpoint,
+        control=scheduler_control,
+    )
+    scheduler_control.pipeline = pipeline
+    try:
+        await pipeline.run(subs)
+    except asyncio.CancelledError:
+        # Запуск остается незавершенным и продолжится после перезапуска
+        await save_checkpoint(checkpoint)
+        raise
+    except Exception as e:
+        logger.error(f"Критическая ошибка при сборе данных: {str(e)}")
+        await save_checkpoint(checkpoint, status="failed")
+        return
+    finally:
+        checkpoint_task.cancel()
+        scheduler_control.pipeline = None
+        if hasattr(subs, "aclose"):
+            await subs.aclose()
+
+    await save_checkpoint(checkpoint, status="completed")
+    if not only_subscribed:
+        orphans_refreshed_at = time.monotonic()
+    logger.info(
+        f"Запуск {run.id} завершен за {checkpoint.duration:.1f} с. "
+        f"Всего: {checkpoint.total}, Успешно: {checkpoint.processed}, "
+        f"Ошибок: {checkpoint.failed}"
+    )
+    logger.info(f"Метрики клиента Wildberries: {wb_client.metrics.snapshot()}")
+
+
+async def refresh_products(artikuls: list[str]):
+    """
+    Срочное обновление товаров вне цикла планировщика.
+
+    Args:
+        artikuls: Артикулы товаров Wildberries
+    """
+    async with async_session() as session:
+        subs = await product_repository.get_products_by_artikuls(
+            "wildberries", list(dict.fromkeys(artikuls)), session
+        )
+    if not subs:
+        return
+    stats = await RefreshPipeline(client=wb_client, repository=product_repository).run(
+        subs
+    )
+    logger.info(
+        f"Срочное обновление завершено за {stats.duration:.1f} с. "
+        f"Успешно: {stats.processed}, Ошибок: {stats.failed}"
+    )
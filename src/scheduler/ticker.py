@@ -0,0 +1,181 @@
+"""
+Периодический запуск задачи по монотонным часам.
+
+Моменты запуска вычисляются от одной опорной точки (start + k * interval),
+поэтому длительность задачи и неточность sleep не накапливаются. Опорная
+точка выравнивается по настенным часам: при интервале 5 минут запуски
+приходятся на :00, :05, :10 и т.д.
+"""
+
+import asyncio
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+# Что делать, если к следующему запуску предыдущий еще не завершен:
+# skip - пропустить запуск, queue - запустить сразу после завершения
+# предыдущего, cancel - прервать предыдущий и запустить новый
+SCHEDULER_OVERLAP_POLICY = os.getenv("SCHEDULER_OVERLAP_POLICY", "skip")
+# Случайная задержка запуска в секундах, чтобы реплики не обращались к API
+# одновременно. Сетка запусков от нее не сдвигается
+SCHEDULER_JITTER_SECONDS = float(os.getenv("SCHEDULER_JITTER_SECONDS", 0))
+SCHEDULER_ALIGN_TO_CLOCK = os.getenv("SCHEDULER_ALIGN_TO_CLOCK", "1") == "1"
+
+OVERLAP_POLICIES = ("skip", "queue", "cancel")
+
+
+@dataclass
+class TickerStats:
+    ticks: int = 0
+    runs: int = 0
+    skipped: int = 0
+    queued: int = 0
+    cancelled: int = 0
+    missed: int = 0
+    failed: int = 0
+    # Задержка фактического начала запуска относительно сетки, в секундах
+    last_lag: Optional[float] = None
+    max_lag: float = 0.0
+    last_duration: Optional[float] = None
+
+
+class PeriodicScheduler:
+    """
+    Запускает задачу каждые interval секунд.
+
+    Args:
+        job: Асинхронная задача
+        interval: Период запуска в секундах
+        overlap_policy: skip, queue или cancel
+        jitter: Максимальная случайная задержка запуска в секундах
+        align: Выравнивать запуски по настенным часам
+    """
+
+    def __init__(
+        self,
+        job: Callable[[], Awaitable[None]],
+        interval: float,
+        overlap_policy: str = SCHEDULER_OVERLAP_POLICY,
+        jitter: float = SCHEDULER_JITTER_SECONDS,
+        align: bool = SCHEDULER_ALIGN_TO_CLOCK,
+    ):
+        if overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(
+                f"Unknown overlap policy {overlap_policy}, expected one of {OVERLAP_POLICIES}"
+            )
+        self.job = job
+        self.interval = interval
+        self.overlap_policy = overlap_policy
+        self.jitter = jitter
+        self.align = align
+        self.stats = TickerStats()
+        self._task: Optional[asyncio.Task] = None
+        self._pending_tick: Optional[float] = None
+
+    def _first_tick(self) -> float:
+        now = time.monotonic()
+        if not self.align:
+            return now
+        wall = time.time()
+        next_wall = math.ceil(wall / self.interval) * self.interval
+        return now + (next_wall - wall)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run_job(self, scheduled: float):
+        started = time.monotonic()
+        lag = started - scheduled
+        self.stats.runs += 1
+        self.stats.last_lag = lag
+        self.stats.max_lag = max(self.stats.max_lag, lag)
+        logger.info(f"Запуск сбора данных, отставание от расписания {lag:.2f} с")
+        try:
+            await self.job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats.failed += 1
+            logger.exception(f"Ошибка в планировщике: {str(e)}")
+        finally:
+            self.stats.last_duration = time.monotonic() - started
+            if self.stats.last_duration > self.interval:
+                logger.warning(
+                    f"Сбор данных занял {self.stats.last_duration:.1f} с, "
+                    f"больше интервала {self.interval:.0f} с"
+                )
+
+    def _launch(self, scheduled: float):
+        self._task = asyncio.create_task(self._run_job(scheduled))
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        if task is self._task and self._pending_tick is not None:
+            scheduled, self._pending_tick = self._pending_tick, None
+            self._launch(scheduled)
+
+    async def _on_tick(self, scheduled: float):
+        self.stats.ticks += 1
+        if not self.running:
+            self._launch(scheduled)
+            return
+
+        if self.overlap_policy == "skip":
+            self.stats.skipped += 1
+            logger.warning("Предыдущий сбор данных не завершен, запуск пропущен")
+        elif self.overlap_policy == "queue":
+            self.stats.queued += 1
+            self._pending_tick = scheduled
+            logger.warning("Предыдущий сбор данных не завершен, запуск отложен")
+        else:
+            self.stats.cancelled += 1
+            logger.warning("Предыдущий сбор данных не завершен и будет прерван")
+            task = self._task
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            self._launch(scheduled)
+
+    async def run(self):
+        """
+        Цикл планировщика. Завершается только отменой.
+        """
+        tick = self._first_tick()
+        try:
+            while True:
+                delay = tick - time.monotonic()
+                if delay > 0:
+                    logger.debug(f"До следующего сбора данных осталось {delay:.0f} с")
+                    await asyncio.sleep(delay)
+
+                # Если процесс простаивал дольше интервала, пропущенные
+                # запуски не выполняются подряд, а объединяются в один
+                missed = int((time.monotonic() - tick) // self.interval)
+                if missed > 0:
+                    self.stats.missed += missed
+                    tick += missed * self.interval
+                    logger.warning(f"Пропущено запусков по расписанию: {missed}")
+
+                if self.jitter:
+                    await asyncio.sleep(random.uniform(0, self.jitter))
+                await self._on_tick(tick)
+                tick += self.interval
+        finally:
+            self._pending_tick = None
+            if self.running:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Dict, Optional
 
 
 class ProductShema(BaseModel):
@@ -12,6 +13,7 @@ class ProductHistoryShema(BaseModel):
     sell_price: float
     total_quantity: int
     rating: float
+    region_quantities: Optional[Dict[str, int]] = None
 
 
 class ProductRequest(BaseModel):
@@ -28,6 +28,14 @@ def mock_wildberries_api(mocker):
     yield mock
 
 
+@pytest.fixture(autouse=True)
+def disable_product_cache(mocker):
+    # тесты проверяют обращения к API, поэтому кэш всегда пуст
+    mocker.patch.object(
+        wb_client.cache, "get", new_callable=AsyncMock, return_value=None
+    )
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     loop = asyncio.new_event_loop()
@@ -0,0 +1,182 @@
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert, Update
+
+from models import ProductHistoryModel
+from routers.third_party_integrations.service.wb.service.product_repo import (
+    HISTORY_POINT_INTERVAL,
+    ProductRepository,
+)
+from schemas.product import ProductHistoryShema
+
+STEP = HISTORY_POINT_INTERVAL
+START = datetime(2024, 1, 1, 12, 0)
+DATA = {"sell_price": 80.0, "standart_price": 100.0, "total_quantity": 50, "rating": 4.5}
+
+
+class RecordingSession:
+    """Сессия, которая только запоминает выполненные запросы."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+
+class FailingRowSession(RecordingSession):
+    """Сессия, в которой запросы с параметром bad завершаются ошибкой,
+    а savepoint отменяет свои запросы."""
+
+    def __init__(self, bad):
+        super().__init__()
+        self.bad = bad
+
+    async def execute(self, statement):
+        values = []
+        for value in statement.compile(dialect=postgresql.dialect()).params.values():
+            values.extend(value if isinstance(value, list) else [value])
+        if self.bad in values:
+            raise ValueError("bad row")
+        await super().execute(statement)
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        position = len(self.statements)
+        try:
+            yield
+        except Exception:
+            del self.statements[position:]
+            raise
+
+
+def history_row(id, created_at, valid_to=None, **data):
+    return ProductHistoryModel(
+        id=id, product_id=1, created_at=created_at, valid_to=valid_to, **{**DATA, **data}
+    )
+
+
+def test_expand_intervals_keeps_append_rows():
+    rows = [history_row(2, START + STEP), history_row(1, START)]
+
+    assert ProductRepository._expand_intervals(rows, 10) == rows
+    assert ProductRepository._expand_intervals(rows, 1) == rows[:1]
+
+
+def test_expand_intervals_restores_points():
+    rows = [
+        history_row(2, START + 3 * STEP, START + 4 * STEP, sell_price=70.0),
+        history_row(1, START, START + 2 * STEP),
+    ]
+
+    points = ProductRepository._expand_intervals(rows, 10)
+
+    assert [point.created_at for point in points] == [
+        START + 4 * STEP,
+        START + 3 * STEP,
+        START + 2 * STEP,
+        START + STEP,
+        START,
+    ]
+    assert [point.sell_price for point in points] == [70.0, 70.0, 80.0, 80.0, 80.0]
+    assert [point.id for point in points] == [2, 2, 1, 1, 1]
+    assert len(ProductRepository._expand_intervals(rows, 3)) == 3
+
+
+def test_expand_intervals_window():
+    rows = [history_row(1, START, START + 10 * STEP)]
+
+    points = ProductRepository._expand_intervals(
+        rows, 100, since=START + 2 * STEP, before=START + 5 * STEP
+    )
+
+    assert [point.created_at for point in points] == [
+        START + 4 * STEP,
+        START + 3 * STEP,
+        START + 2 * STEP,
+    ]
+
+
+def test_same_snapshot():
+    row = history_row(1, START)
+
+    assert ProductRepository._same_snapshot(row, ProductHistoryShema(**DATA))
+    assert not ProductRepository._same_snapshot(
+        row, ProductHistoryShema(**{**DATA, "total_quantity": 49})
+    )
+    assert not ProductRepository._same_snapshot(
+        row, ProductHistoryShema(**DATA, region_quantities={"-1257786": 50})
+    )
+
+
+@pytest.mark.asyncio
+async def test_extend_unchanged_history_interval_mode():
+    repository = ProductRepository(storage_mode="interval")
+    session = RecordingSession()
+    snapshots = {1: ProductHistoryShema(**DATA), 2: ProductHistoryShema(**DATA)}
+
+    extended = await repository._extend_unchanged_history(
+        snapshots, session, unchanged={1: 10}
+    )
+
+    assert extended == {1}
+    [statement] = session.statements
+    assert isinstance(statement, Update)
+    assert statement.table.name == "product_history"
+    assert statement.compile().params["id_1"] == [10]
+
+    session = RecordingSession()
+    assert await repository._extend_unchanged_history(snapshots, session, {}) == set()
+    assert session.statements == []
+
+
+@pytest.mark.asyncio
+async def test_extend_unchanged_history_append_mode():
+    repository = ProductRepository(storage_mode="append")
+    session = RecordingSession()
+
+    extended = await repository._extend_unchanged_history(
+        {1: ProductHistoryShema(**DATA)}, session, unchanged={1: 10}
+    )
+
+    assert extended == set()
+    assert session.statements == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_history_keeps_rows_after_failed_extend():
+    repository = ProductRepository(storage_mode="interval")
+    # Продление строки истории 102 (товар 2) завершается ошибкой
+    session = FailingRowSession(bad=102)
+    snapshots = {product_id: ProductHistoryShema(**DATA) for product_id in (1, 2, 3)}
+
+    failures = await repository.add_products_history_bulk(
+        snapshots, session, unchanged={1: 101, 2: 102}
+    )
+
+    assert list(failures) == [2]
+    extend, latest, insert_history, inserted_latest = session.statements
+    assert isinstance(extend, Update)
+    assert extend.compile().params["id_1"] == [101]
+    assert latest.table.name == inserted_latest.table.name == "product_latest"
+    assert isinstance(insert_history, Insert)
+    assert insert_history.table.name == "product_history"
+    assert insert_history.compile().params["product_id_m0"] == 3
+
+
+@pytest.mark.asyncio
+async def test_upsert_latest_keeps_newer_data():
+    session = RecordingSession()
+
+    await ProductRepository()._upsert_latest({1: ProductHistoryShema(**DATA)}, session)
+
+    [statement] = session.statements
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (product_id) DO UPDATE" in sql
+    # Запись, начатая раньше сохраненной, ее не перезаписывает
+    assert sql.endswith(
+        "WHERE product_latest.created_at <= excluded.created_at"
+    )
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from routers.third_party_integrations.service.wb.service.product_index import (
+    ProductIdIndex,
+)
+from routers.third_party_integrations.service.wb.service.product_repo import (
+    ProductRepository,
+)
+
+
+class ProductIdSession:
+    """Сессия, которая возвращает заданный id товара."""
+
+    def __init__(self, product_id):
+        self.product_id = product_id
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return SimpleNamespace(
+            scalars=lambda: SimpleNamespace(first=lambda: self.product_id)
+        )
+
+
+def test_index_evicts_least_recently_used():
+    index = ProductIdIndex(max_size=2)
+    index.set("wildberries", "1", 1)
+    index.set("wildberries", "2", 2)
+
+    assert index.get("wildberries", "1") == 1
+    index.set("wildberries", "3", 3)
+
+    assert len(index) == 2
+    assert index.get("wildberries", "2") is None
+    assert index.get("wildberries", "1") == 1
+    assert index.get("wildberries", "3") == 3
+
+
+def test_index_counts_hits_and_misses():
+    index = ProductIdIndex(max_size=10)
+    index.set("wildberries", "1", 1)
+
+    index.get("wildberries", "1")
+    index.get("wildberries", "2")
+    index.get(None, "1")
+
+    assert index.snapshot() == {"size": 1, "max_size": 10, "hits": 1, "misses": 2}
+
+
+def test_index_invalidate_drops_any_marketplace_entry():
+    index = ProductIdIndex(max_size=10)
+    index.set("wildberries", "1", 1)
+    index.set(None, "1", 1)
+
+    index.invalidate("wildberries", "1")
+
+    assert len(index) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_product_id_falls_back_to_database():
+    repository = ProductRepository(index=ProductIdIndex(max_size=10))
+    session = ProductIdSession(product_id=7)
+
+    assert await repository.get_product_id("177241487", session) == 7
+    assert await repository.get_product_id("177241487", session) == 7
+
+    # Второй вызов обслуживается индексом
+    [statement] = session.statements
+    params = statement.compile(dialect=postgresql.dialect()).params
+    # Без маркетплейса подходит товар любого маркетплейса
+    assert "wildberries" not in params.values()
+    assert repository.index.snapshot()["hits"] == 1
+
+    await repository.get_product_id("177241487", session, marketplace="wildberries")
+    assert len(session.statements) == 2
+    params = session.statements[1].compile(dialect=postgresql.dialect()).params
+    assert "wildberries" in params.values()
+
+
+@pytest.mark.asyncio
+async def test_get_product_id_does_not_cache_missing_products():
+    repository = ProductRepository(index=ProductIdIndex(max_size=10))
+    session = ProductIdSession(product_id=None)
+
+    assert await repository.get_product_id("177241487", session) is None
+    assert len(repository.index) == 0
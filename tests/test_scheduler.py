@@ -0,0 +1,371 @@
+import asyncio
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Delete, Update
+
+from models import RefreshRunModel
+from routers.third_party_integrations.service.wb.service.product_repo import (
+    ProductRepository,
+)
+from scheduler.pipeline import RefreshPipeline
+from scheduler.polling import POLL_DUE_TOLERANCE_SECONDS, compute_next_interval
+from scheduler.refresh_runs import RefreshRunRepository, RunCheckpoint
+from scheduler.ticker import PeriodicScheduler
+
+
+class BlockedClient:
+    """Клиент, запросы которого не завершаются."""
+
+    batch_size = 1
+
+    async def fetch_products_details(self, artikuls):
+        await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_pipeline_leaves_no_tasks():
+    pipeline = RefreshPipeline(
+        client=BlockedClient(), repository=object(), fetch_workers=1
+    )
+    subs = [SimpleNamespace(id=i, artikul=str(i)) for i in range(1, 101)]
+    tasks = asyncio.all_tasks()
+
+    run = asyncio.create_task(pipeline.run(subs))
+    # Очередь пакетов заполнена, загрузка каталога ждет свободного места
+    await asyncio.sleep(0.1)
+    assert pipeline.queue_depths()["fetch"] == 2
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    await asyncio.sleep(0.1)
+
+    assert asyncio.all_tasks() == tasks
+
+
+class FailingClient:
+    """Клиент, первый пакет которого завершается ошибкой, а второй
+    возвращает данные, которые нельзя преобразовать."""
+
+    batch_size = 2
+
+    def __init__(self):
+        self.calls = 0
+
+    async def fetch_products_details(self, artikuls):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("connection reset")
+        return {artikul: "broken" for artikul in artikuls}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_counts_unexpected_errors():
+    subs = [SimpleNamespace(id=i, artikul=str(i)) for i in range(1, 5)]
+    checkpoint = RunCheckpoint(make_run(), [sub.id for sub in subs])
+    pipeline = RefreshPipeline(
+        client=FailingClient(),
+        repository=object(),
+        fetch_workers=1,
+        adaptive_polling=False,
+        checkpoint=checkpoint,
+    )
+
+    stats = await pipeline.run(subs)
+
+    assert (stats.total, stats.processed, stats.failed) == (4, 0, 4)
+    assert checkpoint.cursor == 4
+    assert checkpoint.failures["1"].startswith("ошибка запроса")
+    assert checkpoint.failures["4"].startswith("ошибка преобразования")
+
+
+class ScheduleRecorder:
+    def __init__(self):
+        self.failed = []
+
+    async def update_poll_schedule(self, changes, session, failed=()):
+        self.failed.extend(failed)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_postpones_failed_products():
+    repository = ScheduleRecorder()
+    pipeline = RefreshPipeline(
+        client=FailingClient(), repository=repository, fetch_workers=1
+    )
+
+    await pipeline.run([SimpleNamespace(id=i, artikul=str(i)) for i in (1, 2)])
+
+    assert repository.failed == [1, 2]
+
+
+def test_compute_next_interval():
+    limits = {"min_interval": 300, "max_interval": 86400, "backoff": 2}
+
+    assert compute_next_interval(0, 0, **limits) == 300
+    assert compute_next_interval(3, 0, **limits) == 2400
+    assert compute_next_interval(1000, 0, **limits) == 86400
+    # Подписчики сокращают интервал, но не ниже минимального
+    assert compute_next_interval(3, 3, **limits) == 800
+    assert compute_next_interval(0, 100, **limits) == 300
+    # Товар без подписчиков опрашивается не чаще orphan_interval
+    assert compute_next_interval(0, 0, orphan_interval=3600, **limits) == 3600
+    assert compute_next_interval(0, 1, orphan_interval=3600, **limits) == 300
+
+
+def test_changed_product_is_due_next_tick():
+    tick = 300
+    # Данные записаны через 20 с после начала цикла
+    next_poll_at = 20 + compute_next_interval(
+        0, 0, min_interval=tick, orphan_interval=None
+    )
+
+    assert next_poll_at > tick
+    assert next_poll_at <= tick + POLL_DUE_TOLERANCE_SECONDS
+
+
+class CapturingSession:
+    def __init__(self, rows=()):
+        self.statements = []
+        self.rows = list(rows)
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return SimpleNamespace(
+            all=lambda: self.rows,
+            scalars=lambda: SimpleNamespace(
+                first=lambda: self.rows[0] if self.rows else None
+            ),
+        )
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_get_due_products_applies_tolerance():
+    session = CapturingSession()
+
+    await ProductRepository().get_due_products("wildberries", session, tolerance=90)
+
+    [statement] = session.statements
+    params = statement.compile(dialect=postgresql.dialect()).params
+    assert timedelta(seconds=90) in params.values()
+
+
+@pytest.mark.asyncio
+async def test_failed_product_is_not_due_next_tick():
+    tick = 300
+    # id, unchanged_streak, failure_streak, подписчики
+    session = CapturingSession(rows=[(1, 3, 0, 0)])
+
+    await ProductRepository().update_poll_schedule({}, session, failed=[1])
+
+    _, upsert = session.statements
+    params = upsert.compile(dialect=postgresql.dialect()).params
+    assert params["failure_streak_m0"] == 1
+    # Серия опросов без изменений после неудачи не сбрасывается
+    assert params["unchanged_streak_m0"] == 3
+    assert params["interval_seconds_m0"] > tick + POLL_DUE_TOLERANCE_SECONDS
+
+
+def make_run(**values):
+    return RefreshRunModel(id=1, **{"cursor": 0, "processed": 0, "failed": 0, **values})
+
+
+def test_checkpoint_cursor_waits_for_gaps():
+    checkpoint = RunCheckpoint(make_run(), [1, 2, 3, 5, 8])
+
+    checkpoint.mark(2, "2")
+    assert checkpoint.cursor == 0
+    checkpoint.mark(1, "1")
+    assert checkpoint.cursor == 2
+    checkpoint.mark(5, "5", reason="данные не получены")
+    checkpoint.mark(3, "3")
+    assert checkpoint.cursor == 5
+    checkpoint.mark(8, "8")
+    assert checkpoint.cursor == 8
+
+    assert (checkpoint.processed, checkpoint.failed) == (4, 1)
+    assert checkpoint.failures == {"5": "данные не получены"}
+
+
+def test_checkpoint_resumes_after_cursor():
+    run = make_run(cursor=3, processed=2, failed=1, failures={"2": "ошибка"})
+    checkpoint = RunCheckpoint(run, [1, 2, 3, 4, 6])
+
+    assert checkpoint.total == 5
+    checkpoint.mark(6, "6")
+    assert checkpoint.cursor == 3
+    checkpoint.mark(4, "4")
+    assert checkpoint.cursor == 6
+    assert checkpoint.failures == {"2": "ошибка"}
+
+
+def test_checkpoint_tracks_streamed_products():
+    checkpoint = RunCheckpoint(make_run())
+    for product_id in (1, 4, 7):
+        checkpoint.track(product_id)
+
+    checkpoint.mark(4, "4")
+    checkpoint.mark(1, "1")
+
+    assert checkpoint.total == 3
+    assert checkpoint.cursor == 4
+
+
+def test_checkpoint_limits_failures():
+    checkpoint = RunCheckpoint(make_run(), [1, 2], max_failures=1)
+
+    checkpoint.mark(1, "1", reason="a")
+    checkpoint.mark(2, "2", reason="b")
+
+    assert checkpoint.failed == 2
+    assert checkpoint.failures == {"1": "a"}
+
+
+@pytest.mark.asyncio
+async def test_start_run_abandons_stale_runs_and_filters_scope():
+    run = make_run(status="running", scope={"shards": [1]})
+    session = CapturingSession(rows=[run])
+
+    assert await RefreshRunRepository().start_run(
+        {"shards": [1]}, session, stale_minutes=15
+    ) is run
+
+    abandon, find = session.statements
+    assert isinstance(abandon, Update)
+    abandon_params = abandon.compile(dialect=postgresql.dialect()).params
+    assert abandon_params["status"] == "abandoned"
+    assert timedelta(minutes=15) in abandon_params.values()
+    find_params = find.compile(dialect=postgresql.dialect()).params
+    assert {"shards": [1]} in find_params.values()
+    assert session.commits == 1
+
+
+class NewRunSession(CapturingSession):
+    def add(self, run):
+        self.added = run
+
+    async def refresh(self, run):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_start_run_deletes_old_runs():
+    session = NewRunSession()
+
+    run = await RefreshRunRepository().start_run(
+        {"shards": [1]}, session, retention_days=7
+    )
+
+    assert run is session.added
+    _, _, cleanup = session.statements
+    assert isinstance(cleanup, Delete)
+    cleanup_params = cleanup.compile(dialect=postgresql.dialect()).params
+    assert cleanup_params["status_1"] == "running"
+    assert timedelta(days=7) in cleanup_params.values()
+
+    session = NewRunSession()
+    await RefreshRunRepository().start_run({"shards": [1]}, session, retention_days=0)
+    assert len(session.statements) == 2
+
+
+class SlowJob:
+    """Задача, которая выполняется дольше интервала планировщика."""
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.running = 0
+        self.max_running = 0
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.duration)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+
+
+async def run_ticker(ticker: PeriodicScheduler, seconds: float):
+    task = asyncio.create_task(ticker.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_ticker_skips_overlapping_runs():
+    job = SlowJob(0.25)
+    ticker = PeriodicScheduler(job, 0.1, overlap_policy="skip", align=False)
+
+    await run_ticker(ticker, 0.55)
+
+    assert job.max_running == 1
+    assert ticker.stats.skipped >= 2
+    assert ticker.stats.runs + ticker.stats.skipped == ticker.stats.ticks
+    assert ticker.stats.runs == job.started
+
+
+@pytest.mark.asyncio
+async def test_ticker_queues_one_overlapping_run():
+    job = SlowJob(0.25)
+    ticker = PeriodicScheduler(job, 0.1, overlap_policy="queue", align=False)
+
+    await run_ticker(ticker, 0.55)
+
+    assert job.max_running == 1
+    assert ticker.stats.queued >= 2
+    # Отложенные запуски объединяются и начинаются сразу после предыдущего
+    assert ticker.stats.runs == job.started < ticker.stats.ticks
+    assert ticker.stats.max_lag > 0.03
+
+
+@pytest.mark.asyncio
+async def test_ticker_cancels_overlapping_run():
+    job = SlowJob(0.25)
+    ticker = PeriodicScheduler(job, 0.1, overlap_policy="cancel", align=False)
+
+    await run_ticker(ticker, 0.35)
+
+    assert job.max_running == 1
+    assert ticker.stats.cancelled >= 2
+    # Последний запуск прерывается остановкой планировщика
+    assert job.cancelled == ticker.stats.cancelled + 1
+    assert job.started == ticker.stats.ticks
+
+
+@pytest.mark.asyncio
+async def test_ticker_merges_missed_ticks():
+    calls = []
+
+    async def job():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            # Цикл событий заблокирован дольше нескольких интервалов
+            time.sleep(0.35)
+
+    ticker = PeriodicScheduler(job, 0.1, align=False)
+
+    await run_ticker(ticker, 0.5)
+
+    assert ticker.stats.missed >= 2
+    # Пропущенные запуски не выполняются подряд, а объединяются в один
+    assert ticker.stats.runs == ticker.stats.ticks == len(calls) <= 4
+
+
+def test_ticker_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        PeriodicScheduler(SlowJob(0), 1, overlap_policy="parallel")
@@ -0,0 +1,91 @@
+import pytest
+from loguru import logger
+
+import routers.scheduler.router as scheduler_router
+
+
+@pytest.fixture
+def admin_user(auth_user, mocker):
+    mocker.patch.object(
+        scheduler_router, "SCHEDULER_ADMIN_IDS", {auth_user["user_id"]}
+    )
+    return auth_user
+
+
+@pytest.mark.asyncio
+async def test_pause_and_resume_scheduler(async_client, admin_user):
+    logger.info("Starting test_pause_and_resume_scheduler")
+    response = await async_client.post(
+        "/api/v1/scheduler/pause", headers=admin_user["headers"]
+    )
+    assert response.status_code == 200, response.text
+
+    response = await async_client.get(
+        "/api/v1/scheduler/status", headers=admin_user["headers"]
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["paused"] is True
+
+    response = await async_client.post(
+        "/api/v1/scheduler/resume", headers=admin_user["headers"]
+    )
+    assert response.status_code == 200, response.text
+
+    response = await async_client.get(
+        "/api/v1/scheduler/status", headers=admin_user["headers"]
+    )
+    assert response.json()["paused"] is False
+    logger.info("Finished test_pause_and_resume_scheduler")
+
+
+@pytest.mark.asyncio
+async def test_refresh_products(async_client, admin_user):
+    logger.info("Starting test_refresh_products")
+    response = await async_client.post(
+        "/api/v1/third-party/wildberries/add-product",
+        headers=admin_user["headers"],
+        json={"artikul": "235745004"},
+    )
+    assert response.status_code == 200, response.text
+
+    response = await async_client.post(
+        "/api/v1/scheduler/refresh",
+        headers=admin_user["headers"],
+        json={"artikuls": ["235745004", "999999999"]},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["queued"] == ["235745004"]
+    assert data["not_found"] == ["999999999"]
+    assert data["queue_depth"] >= 1
+    logger.info("Finished test_refresh_products")
+
+
+@pytest.mark.asyncio
+async def test_refresh_unknown_products(async_client, admin_user):
+    response = await async_client.post(
+        "/api/v1/scheduler/refresh",
+        headers=admin_user["headers"],
+        json={"artikuls": ["999999998"]},
+    )
+    assert response.status_code == 404, response.text
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rejects_invalid_token(async_client):
+    response = await async_client.get(
+        "/api/v1/scheduler/status", headers={"Authorization": "Bearer invalid"}
+    )
+    assert response.status_code == 401, response.text
+
+
+@pytest.mark.asyncio
+async def test_scheduler_requires_admin(async_client, auth_user):
+    for path in ("/api/v1/scheduler/pause", "/api/v1/scheduler/resume"):
+        response = await async_client.post(path, headers=auth_user["headers"])
+        assert response.status_code == 403, response.text
+
+    response = await async_client.get(
+        "/api/v1/scheduler/status", headers=auth_user["headers"]
+    )
+    assert response.status_code == 403, response.text
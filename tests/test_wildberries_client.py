@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+
+import pytest
+import pytest_asyncio
+
+from routers.third_party_integrations.service.wb.service.wildberries_api_client import (
+    WildberriesAPIClient,
+)
+from routers.third_party_integrations.service.wb.service.circuit_breaker import (
+    CircuitBreakerOpenError,
+)
+from tests.wb_stub import StubConfig, start_stub
+
+
+class MemoryRedis:
+    """Хранилище кэша товаров в памяти вместо Redis."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get_product_details(self, artikul):
+        return self.data.get(artikul)
+
+    async def save_product_details(self, artikul, payload, ttl):
+        self.data[artikul] = payload
+
+    async def save_products_details(self, payloads, ttl):
+        self.data.update(payloads)
+
+    def put(self, artikul, payload, age):
+        self.data[artikul] = json.dumps(
+            {"fetched_at": time.time() - age, "payload": payload}
+        )
+
+
+@pytest_asyncio.fixture
+async def stub_client(request):
+    config = getattr(request, "param", None) or StubConfig(seed=1)
+    stub, runner, url = await start_stub(config)
+    client = WildberriesAPIClient(base_url=url)
+    client.cache.enabled = False
+    client.retry_base_delay = 0.01
+    yield stub, client
+    await client.close()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_fetch_products_details_batches(stub_client):
+    stub, client = stub_client
+    client.batch_size = 10
+    artikuls = [str(177241487 + i) for i in range(35)]
+
+    result = await client.fetch_products_details(artikuls)
+
+    assert list(result) == artikuls
+    assert all(result[artikul]["artikul"] == artikul for artikul in artikuls)
+    assert stub.stats.requests == 4
+
+
+@pytest.mark.asyncio
+async def test_fetch_product_details_aggregates_destinations(stub_client):
+    stub, client = stub_client
+    client.destinations = ["-1257786", "-1181032"]
+
+    product = await client.fetch_product_details("177241487")
+
+    assert product["region_quantities"] == {
+        "-1257786": product["total_quantity"],
+        "-1181032": product["total_quantity"],
+    }
+    assert stub.stats.destinations == {"-1257786": 1, "-1181032": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "stub_client",
+    [StubConfig(burst_every=100, burst_length=1, retry_after=0.1, seed=1)],
+    indirect=True,
+)
+async def test_fetch_product_details_retries_after_429(stub_client):
+    stub, client = stub_client
+
+    product = await client.fetch_product_details("177241487")
+
+    assert product["artikul"] == "177241487"
+    assert stub.stats.throttled == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "stub_client", [StubConfig(error_rate=1.0, seed=1)], indirect=True
+)
+async def test_circuit_breaker_fails_fast(stub_client):
+    stub, client = stub_client
+    client.circuit_breaker.failure_threshold = client.max_retries
+
+    assert await client.fetch_product_details("177241487") is None
+    with pytest.raises(CircuitBreakerOpenError):
+        await client.fetch_product_details("177241487")
+    assert stub.stats.requests == client.max_retries
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_retried(stub_client):
+    stub, client = stub_client
+    # Неизвестный путь заглушка отклоняет ответом 404
+    client.base_url += "/missing"
+
+    assert await client.fetch_products_details(["177241487"]) == {
+        "177241487": None
+    }
+    assert client.metrics.attempts.snapshot() == {"404": 1}
+    assert client.metrics.calls.snapshot() == {"rejected": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stub_client", [StubConfig(latency=1.0, seed=1)], indirect=True)
+async def test_cancelled_probe_releases_circuit_breaker(stub_client):
+    stub, client = stub_client
+    client.circuit_breaker.failure_threshold = 1
+    client.circuit_breaker.recovery_timeout = 0
+    client.circuit_breaker.record_failure()
+
+    task = asyncio.create_task(client.fetch_products_details(["177241487"]))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert client.circuit_breaker.state == client.circuit_breaker.HALF_OPEN
+    assert client.circuit_breaker.allow_request()
+
+
+@pytest_asyncio.fixture
+async def cached_client(stub_client):
+    stub, client = stub_client
+    client.cache.redis_client = MemoryRedis()
+    client.cache.enabled = True
+    yield stub, client
+    for task in list(client._refresh_tasks.values()):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_get_product_details_uses_fresh_cache(cached_client):
+    stub, client = cached_client
+    client.cache.redis_client.put("177241487", {"artikul": "177241487"}, age=0)
+
+    assert await client.get_product_details("177241487") == {"artikul": "177241487"}
+    assert await client.get_product_details("177241487", allow_stale=False) == {
+        "artikul": "177241487"
+    }
+    assert stub.stats.requests == 0
+
+
+@pytest.mark.asyncio
+async def test_get_product_details_stale_cache(cached_client):
+    stub, client = cached_client
+    stale = {"artikul": "177241487", "sell_price": -1.0}
+    client.cache.redis_client.put("177241487", stale, age=client.cache.ttl + 1)
+
+    # Устаревшая запись отдается сразу и обновляется в фоне
+    assert await client.get_product_details("177241487") == stale
+    await asyncio.gather(*client._refresh_tasks.values())
+    assert stub.stats.requests == 1
+
+    # Для записи в историю устаревшая запись заменяется ответом API
+    client.cache.redis_client.put("177241487", stale, age=client.cache.ttl + 1)
+    product = await client.get_product_details("177241487", allow_stale=False)
+    assert product["sell_price"] != stale["sell_price"]
+    assert stub.stats.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_corrupted_cache_entry_is_a_miss(cached_client):
+    stub, client = cached_client
+    client.cache.redis_client.data["177241487"] = "{not json"
+
+    product = await client.get_product_details("177241487")
+
+    assert product["artikul"] == "177241487"
+    assert stub.stats.requests == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stub_client", [StubConfig(latency=0.2, seed=1)], indirect=True)
+async def test_fetch_product_details_coalesces_concurrent_calls(stub_client):
+    stub, client = stub_client
+
+    products = await asyncio.gather(
+        *(client.fetch_product_details("177241487") for _ in range(10))
+    )
+
+    assert all(product["artikul"] == "177241487" for product in products)
+    # Каждый вызывающий получает свою копию
+    assert len({id(product) for product in products}) == 10
+    assert stub.stats.requests == 1
@@ -1,6 +1,10 @@
 import pytest
 from loguru import logger
+from sqlalchemy import text
 import sys
+import asyncio
+
+from database.main import SCHEMA_UPGRADES, async_session
 
 @pytest.mark.asyncio
 async def test_get_product_details(async_client, auth_user, mock_wildberries_api):
@@ -61,3 +65,164 @@ async def test_get_lasted_products_by_artikul(async_client, auth_user):
     json_response = response.json()
     assert json_response['count'] == len(json_response['result'])
     logger.info("Finished test_get_last_dataproduct_by_artikul")
+
+
+@pytest.mark.asyncio
+async def test_get_product_history_range(async_client, auth_user):
+    logger.info('Starting test_get_product_history_range')
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/get-product-history-range/235745003",
+        headers = auth_user['headers'],
+        params = {
+            "date_from": "2000-01-01T00:00:00",
+            "date_to": "2100-01-01T00:00:00",
+            "limit": 1,
+        },
+    )
+    assert (
+        response.status_code == 200
+        ),f"Unexpected status code: {response.status_code}, body: {response.text}"
+    json_response = response.json()
+    assert json_response['count'] == len(json_response['result']) == 1
+    assert json_response['next_cursor'] == json_response['result'][0]['created_at']
+
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/get-product-history-range/235745003",
+        headers = auth_user['headers'],
+        params = {
+            "date_from": "2100-01-01T00:00:00",
+            "date_to": "2000-01-01T00:00:00",
+        },
+    )
+    assert response.status_code == 400
+    logger.info("Finished test_get_product_history_range")
+
+
+@pytest.mark.asyncio
+async def test_get_all_products_paginated_search(async_client, auth_user):
+    logger.info('Starting test_get_all_products_paginated_search')
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/get-all-products-paginated",
+        headers = auth_user['headers'],
+        params = {"page": 1, "per_page": 50, "search_query": "a", "min_similarity": 0},
+    )
+    assert (
+        response.status_code == 200
+        ),f"Unexpected status code: {response.status_code}, body: {response.text}"
+    json_response = response.json()
+    assert json_response
+    for item in json_response:
+        assert set(item) == {"product", "product_data", "similarity"}
+    history = [item["product_data"] for item in json_response if item["product_data"]]
+    assert history
+    for product_data in history:
+        assert {"id", "product_id", "sell_price", "created_at", "valid_to"} <= set(
+            product_data
+        )
+    logger.info("Finished test_get_all_products_paginated_search")
+
+
+@pytest.mark.asyncio
+async def test_get_product_details_concurrent(async_client, auth_user):
+    logger.info("Starting test_get_product_details_concurrent")
+    responses = await asyncio.gather(
+        *(
+            async_client.get(
+                "/api/v1/third-party/wildberries/get-product-details/177241487",
+                headers=auth_user["headers"],
+            )
+            for _ in range(10)
+        )
+    )
+    for response in responses:
+        assert (
+            response.status_code == 200
+        ), f"Unexpected status code: {response.status_code}, body: {response.text}"
+    logger.info("Finished test_get_product_details_concurrent")
+
+
+@pytest.mark.asyncio
+async def test_get_client_metrics(async_client, auth_user):
+    logger.info("Starting test_get_client_metrics")
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/client-metrics",
+        headers=auth_user["headers"],
+    )
+    assert (
+        response.status_code == 200
+    ), f"Unexpected status code: {response.status_code}, body: {response.text}"
+    assert "wb_client_calls_total" in response.json()
+
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/client-metrics?format=prometheus",
+        headers=auth_user["headers"],
+    )
+    assert response.status_code == 200
+    assert "# TYPE wb_client_ttfb_seconds histogram" in response.text
+    logger.info("Finished test_get_client_metrics")
+
+
+async def add_product_with_price(async_client, auth_user, mock_api, artikul, price):
+    mock_api.side_effect = lambda requested: {
+        "artikul": requested,
+        "name": f"Mocked Product {requested}",
+        "standart_price": 100.0,
+        "sell_price": price,
+        "total_quantity": 50,
+        "rating": 4.5,
+    }
+    response = await async_client.post(
+        "/api/v1/third-party/wildberries/add-product",
+        headers=auth_user["headers"],
+        json={"artikul": artikul},
+    )
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.asyncio
+async def test_product_latest_follows_new_history(
+    async_client, auth_user, mock_wildberries_api
+):
+    for price in (80.0, 70.0):
+        await add_product_with_price(
+            async_client, auth_user, mock_wildberries_api, "235745010", price
+        )
+
+    response = await async_client.get(
+        "/api/v1/third-party/wildberries/get-last-dataproduct-by-artikul/235745010",
+        headers=auth_user["headers"],
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["sell_price"] == 70.0
+
+
+@pytest.mark.asyncio
+async def test_product_latest_backfill(async_client, auth_user, mock_wildberries_api):
+    for price in (60.0, 50.0):
+        await add_product_with_price(
+            async_client, auth_user, mock_wildberries_api, "235745011", price
+        )
+    [backfill] = [
+        statement for statement in SCHEMA_UPGRADES if "INTO product_latest" in statement
+    ]
+
+    async with async_session() as session:
+        # Заполнение выполняется только для пустой таблицы
+        await session.execute(text("DELETE FROM product_latest"))
+        await session.execute(text(backfill))
+        result = await session.execute(
+            text(
+                "SELECT product_latest.sell_price FROM product_latest "
+                "JOIN products ON products.id = product_latest.product_id "
+                "WHERE products.artikul = '235745011'"
+            )
+        )
+        assert result.scalar_one() == 50.0
+        # Повторный запуск не меняет заполненную таблицу
+        await session.execute(text("UPDATE product_latest SET sell_price = 1"))
+        await session.execute(text(backfill))
+        result = await session.execute(
+            text("SELECT count(*) FROM product_latest WHERE sell_price <> 1")
+        )
+        assert result.scalar_one() == 0
+        await session.rollback()
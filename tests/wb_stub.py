@@ -0,0 +1,169 @@
+"""
+Локальная заглушка API card.wb.ru для нагрузочных тестов без сети.
+
+Отдает записанные ответы из tests/payloads, подставляя запрошенные
+артикулы, и позволяет настроить задержку, долю ошибок, серии ответов 429
+и размер ответа.
+
+Запуск:
+    python tests/wb_stub.py --port 8081 --latency 0.05 --error-rate 0.01
+
+Клиент направляется на заглушку переменной окружения
+WB_BASE_URL=http://127.0.0.1:8081/cards/v1/detail
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aiohttp import web
+
+PAYLOADS_DIR = Path(__file__).resolve().parent / "payloads"
+DETAIL_PATH = "/cards/v1/detail"
+# Метка, которая заменяется запрошенным артикулом в заранее сериализованной карточке
+_ID_MARK = b'"id":-999999999'
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.0  # Базовая задержка ответа в секундах
+    latency_jitter: float = 0.0  # Случайная добавка к задержке в секундах
+    error_rate: float = 0.0  # Доля ответов 500
+    burst_every: int = 0  # Каждые N запросов начинается серия 429 (0 - выкл.)
+    burst_length: int = 0  # Длина серии 429
+    retry_after: float = 1.0  # Значение Retry-After для ответов 429
+    size_factor: int = 1  # Во сколько раз увеличить список складов в ответе
+    missing_rate: float = 0.0  # Доля артикулов, отсутствующих в ответе
+    seed: int | None = None
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    products: int = 0
+    errors: int = 0
+    throttled: int = 0
+    destinations: dict = field(default_factory=dict)
+
+
+class WildberriesStub:
+    def __init__(self, config: StubConfig | None = None):
+        self.config = config or StubConfig()
+        self.stats = StubStats()
+        self._random = random.Random(self.config.seed)
+        # Карточки сериализуются один раз, чтобы заглушка не тратила CPU
+        # на каждый ответ и не искажала замеры клиента
+        self._templates = []
+        for path in sorted(PAYLOADS_DIR.glob("wb_detail_*.json")):
+            for product in json.loads(path.read_bytes())["data"]["products"]:
+                product["id"] = int(_ID_MARK.split(b":")[1])
+                for size in product.get("sizes", []):
+                    size["stocks"] = size.get("stocks", []) * self.config.size_factor
+                raw = json.dumps(product, ensure_ascii=False, separators=(",", ":"))
+                self._templates.append(raw.encode().split(_ID_MARK))
+
+    def _product(self, artikul: int) -> bytes:
+        before, after = self._templates[artikul % len(self._templates)]
+        return before + b'"id":' + str(artikul).encode() + after
+
+    def _in_burst(self) -> bool:
+        if not self.config.burst_every or not self.config.burst_length:
+            return False
+        # Серия начинается с первого запроса и повторяется каждые burst_every
+        position = (self.stats.requests - 1) % self.config.burst_every
+        return position < self.config.burst_length
+
+    async def detail(self, request: web.Request) -> web.Response:
+        self.stats.requests += 1
+        dest = request.query.get("dest", "")
+        self.stats.destinations[dest] = self.stats.destinations.get(dest, 0) + 1
+
+        delay = self.config.latency + self._random.uniform(
+            0, self.config.latency_jitter
+        )
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self._in_burst():
+            self.stats.throttled += 1
+            return web.Response(
+                status=429, headers={"Retry-After": str(self.config.retry_after)}
+            )
+        if self._random.random() < self.config.error_rate:
+            self.stats.errors += 1
+            return web.Response(status=500)
+
+        products = [
+            self._product(int(nm))
+            for nm in request.query.get("nm", "").split(";")
+            if nm.isdigit() and self._random.random() >= self.config.missing_rate
+        ]
+        self.stats.products += len(products)
+        body = (
+            b'{"state":0,"payloadVersion":2,"data":{"products":['
+            + b",".join(products)
+            + b"]}}"
+        )
+        return web.Response(body=body, content_type="application/json")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(DETAIL_PATH, self.detail)
+        return app
+
+
+async def start_stub(
+    config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0
+) -> tuple[WildberriesStub, web.AppRunner, str]:
+    """
+    Запускает заглушку в текущем цикле событий.
+
+    Returns:
+        tuple: Заглушка, runner для остановки (runner.cleanup()) и URL
+        для WildberriesAPIClient(base_url=...)
+    """
+    stub = WildberriesStub(config)
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return stub, runner, f"http://{host}:{port}{DETAIL_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wildberries card API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--size-factor", type=int, default=1)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = WildberriesStub(
+        StubConfig(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            error_rate=args.error_rate,
+            burst_every=args.burst_every,
+            burst_length=args.burst_length,
+            retry_after=args.retry_after,
+            size_factor=args.size_factor,
+            missing_rate=args.missing_rate,
+            seed=args.seed,
+        )
+    )
+    web.run_app(stub.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()